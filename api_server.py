@@ -0,0 +1,317 @@
+"""
+API HTTP local (somente leitura) sobre o dataset indexado.
+
+Carrega e indexa as transcrições uma única vez (transcripts.load_dataset) e
+responde a partir dos índices em memória. Cada resposta tem um ETag derivado
+da versão do arquivo de entrada e da URL; requisições condicionais
+(If-None-Match) a URLs válidas recebem 304 sem reenviar o corpo, e respostas
+recentes ficam em um cache LRU, então nada é recalculado.
+
+Endpoints (GET):
+    /stats?desde=YYYY-MM-DD&ate=YYYY-MM-DD   Totais de conversas e feedbacks
+    /rows/<linha>                            Mensagens de uma linha do CSV
+    /threads/<linha>                         Thread (mesclada) que contém a linha
+    /feedbacks?reacao=like|dislike&metodo=ID|ID_CROSS|TEMPO&limit=&offset=
+    /search?q=texto&limit=&offset=           Linhas cujas mensagens contêm o texto
+
+Uso:
+    python api_server.py --porta 8765
+"""
+import argparse
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import parse_qs, urlsplit
+
+from transcripts import (
+    TRANSCRIPTS_FILENAME,
+    compute_statistics_from_index,
+    extract_chat_content,
+    extract_feedback_text,
+    find_transcripts_file,
+    load_dataset,
+    merge_thread_activities,
+)
+
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+RESPONSE_CACHE_SIZE = 256
+
+debug_requests = False
+
+
+class NotFound(LookupError):
+    """Recurso inexistente (responde 404)."""
+
+
+class BadRequest(ValueError):
+    """Parâmetro inválido na requisição (responde 400)."""
+
+
+def build_feedback_list(dataset):
+    """
+    Achata o mapa de feedbacks em uma lista, uma entrada por feedback, com
+    as linhas do CSV onde a mensagem alvo aparece.
+    """
+    global_id_map = dataset['global_id_map']
+    feedback_list = []
+    for msg_id, feedbacks in dataset['all_feedbacks'].items():
+        rows = sorted(set(global_id_map[msg_id]['rows'])) if msg_id in global_id_map else []
+        for feedback in feedbacks:
+            feedback_list.append({
+                'mensagem_id': msg_id,
+                'reacao': feedback.get('reaction', ''),
+                'comentario': extract_feedback_text(feedback),
+                'metodo_identificacao': feedback.get('_metodo_identificacao', ''),
+                'linhas': rows
+            })
+    return feedback_list
+
+
+class TranscriptsAPI:
+    """
+    Responde às consultas a partir do dataset indexado.
+    Cada método de rota recebe os parâmetros da query string e retorna um dict serializável.
+    """
+
+    def __init__(self, dataset, version):
+        self.dataset = dataset
+        self.version = version
+        self.feedback_list = build_feedback_list(dataset)
+        self._cache = OrderedDict()
+        self._cache_lock = Lock()
+
+    def etag(self, url):
+        """ETag da resposta: muda apenas se o arquivo de entrada mudar."""
+        return '"' + hashlib.sha1(f"{self.version}:{url}".encode('utf-8')).hexdigest() + '"'
+
+    def get(self, url):
+        """
+        Retorna (etag, corpo JSON em bytes) para a URL, usando o cache LRU.
+        Lança NotFound ou BadRequest para URLs ou parâmetros inválidos.
+        """
+        with self._cache_lock:
+            if url in self._cache:
+                self._cache.move_to_end(url)
+                return self._cache[url]
+
+        payload = self.route(url)
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        response = (self.etag(url), body)
+
+        with self._cache_lock:
+            self._cache[url] = response
+            if len(self._cache) > RESPONSE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return response
+
+    def route(self, url):
+        """Despacha a URL para o método da rota correspondente."""
+        parts = urlsplit(url)
+        params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        segments = [segment for segment in parts.path.split('/') if segment]
+
+        if segments == ['stats']:
+            return self.stats(params)
+        if len(segments) == 2 and segments[0] == 'rows':
+            return self.row(parse_row(segments[1], len(self.dataset['df'])))
+        if len(segments) == 2 and segments[0] == 'threads':
+            return self.thread(parse_row(segments[1], len(self.dataset['df'])))
+        if segments == ['feedbacks']:
+            return self.feedbacks(params)
+        if segments == ['search']:
+            return self.search(params)
+        raise NotFound(f"Rota não encontrada: {parts.path}")
+
+    def stats(self, params):
+        df = self.dataset['df']
+        start_date = parse_date(params.get('desde'))
+        end_date = parse_date(params.get('ate'))
+
+        mask = [True] * len(df)
+        if (start_date or end_date) and 'conversation_date' in df.columns:
+            dates = df['conversation_date']
+            mask = dates.notna()
+            if start_date:
+                mask &= dates >= start_date
+            if end_date:
+                mask &= dates <= end_date
+        rows = df.index[mask]
+
+        total_positive, total_negative = compute_statistics_from_index(
+            rows, self.dataset['row_message_ids'], self.dataset['all_feedbacks']
+        )
+        total_feedbacks = total_positive + total_negative
+        return {
+            'desde': params.get('desde'),
+            'ate': params.get('ate'),
+            'total_conversas': len(rows),
+            'feedbacks_positivos': total_positive,
+            'feedbacks_negativos': total_negative,
+            'total_feedbacks': total_feedbacks,
+            'percentual_positivo': round(total_positive / total_feedbacks * 100, 1) if total_feedbacks else None
+        }
+
+    def row(self, row_idx):
+        df = self.dataset['df']
+        parsed_data = self.dataset['parsed_json'].get(row_idx)
+        return {
+            'linha': row_idx,
+            'thread': int(df.at[row_idx, 'thread']),
+            'feedback': df.at[row_idx, 'feedback'],
+            'mensagens': extract_chat_content(parsed_data, self.dataset['all_feedbacks'])
+        }
+
+    def thread(self, row_idx):
+        df = self.dataset['df']
+        thread_index = self.dataset['thread_index']
+        thread_id = thread_index['row_to_thread'][row_idx]
+        thread_rows = thread_index['threads'][thread_id]
+        parsed_data = merge_thread_activities(thread_rows, self.dataset['parsed_json'])
+        return {
+            'thread': thread_id,
+            'linhas': thread_rows,
+            'feedback': df.at[thread_id, 'feedback_thread'],
+            'likes': int(df.at[thread_id, 'likes_thread']),
+            'dislikes': int(df.at[thread_id, 'dislikes_thread']),
+            'mensagens': extract_chat_content(parsed_data, self.dataset['all_feedbacks'])
+        }
+
+    def feedbacks(self, params):
+        reaction = params.get('reacao')
+        method = params.get('metodo')
+        limit, offset = parse_page(params)
+
+        matches = [
+            feedback for feedback in self.feedback_list
+            if (not reaction or feedback['reacao'] == reaction) and
+               (not method or feedback['metodo_identificacao'] == method)
+        ]
+        return {'total': len(matches), 'offset': offset, 'feedbacks': matches[offset:offset + limit]}
+
+    def search(self, params):
+        query = params.get('q', '').strip().lower()
+        if not query:
+            raise BadRequest("Parâmetro 'q' é obrigatório")
+        limit, offset = parse_page(params)
+
+        results = []
+        for row_idx, parsed_data in self.dataset['parsed_json'].items():
+            if parsed_data is None:
+                continue
+            for activity in parsed_data.get('activities', []):
+                text = activity.get('text') or activity.get('value', {}).get('newValue') or ''
+                if isinstance(text, str) and query in text.lower():
+                    results.append({'linha': row_idx, 'mensagem_id': activity.get('id'), 'texto': text[:200]})
+        return {'total': len(results), 'offset': offset, 'resultados': results[offset:offset + limit]}
+
+
+def parse_row(value, total_rows):
+    """Converte o segmento da URL em índice de linha válido."""
+    try:
+        row_idx = int(value)
+    except ValueError:
+        raise BadRequest(f"Linha inválida: {value}")
+    if not 0 <= row_idx < total_rows:
+        raise NotFound(f"Linha {row_idx} não existe")
+    return row_idx
+
+
+def parse_date(value):
+    """Converte 'YYYY-MM-DD' em date (ou None se ausente)."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise BadRequest(f"Data inválida: {value} (use YYYY-MM-DD)")
+
+
+def parse_page(params):
+    """Lê limit/offset da query string. Retorna (limit, offset)."""
+    try:
+        limit = min(int(params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        offset = max(int(params.get('offset', 0)), 0)
+    except ValueError:
+        raise BadRequest("Parâmetros 'limit' e 'offset' devem ser inteiros")
+    if limit < 1:
+        raise BadRequest("Parâmetro 'limit' deve ser maior que zero")
+    return limit, offset
+
+
+class APIRequestHandler(BaseHTTPRequestHandler):
+    """Handler HTTP: apenas GET, respostas JSON com ETag e suporte a If-None-Match."""
+
+    api = None
+
+    def do_GET(self):
+        # Rotear antes de responder 304: apenas respostas válidas têm ETag
+        try:
+            etag, body = self.api.get(self.path)
+            status = 200
+        except NotFound as e:
+            status, body = 404, json.dumps({'erro': str(e)}, ensure_ascii=False).encode('utf-8')
+        except BadRequest as e:
+            status, body = 400, json.dumps({'erro': str(e)}, ensure_ascii=False).encode('utf-8')
+        except Exception as e:
+            # Falha do servidor (ex: JSON da linha inválido em extract_chat_content)
+            self.log_error("Erro ao responder %s: %r", self.path, e)
+            status, body = 500, json.dumps({'erro': 'Erro interno do servidor'}, ensure_ascii=False).encode('utf-8')
+
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        if debug_requests:
+            super().log_message(format, *args)
+
+
+def create_server(csv_path, host='127.0.0.1', port=8765):
+    """
+    Carrega o dataset e cria o servidor HTTP (sem iniciá-lo).
+    Use port=0 para escolher uma porta livre.
+    """
+    dataset = load_dataset(csv_path)
+    stat = os.stat(csv_path)
+    api = TranscriptsAPI(dataset, version=f"{stat.st_size}-{stat.st_mtime_ns}")
+    handler = type('BoundAPIRequestHandler', (APIRequestHandler,), {'api': api})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API HTTP local (somente leitura) sobre as transcrições.")
+    parser.add_argument('--csv', default=TRANSCRIPTS_FILENAME,
+                        help="CSV de transcrições de entrada (aceita .csv.gz, .csv.zst, .csv.bz2)")
+    parser.add_argument('--host', default='127.0.0.1', help="Endereço de escuta")
+    parser.add_argument('--porta', type=int, default=8765, help="Porta de escuta")
+    parser.add_argument('--log', action='store_true', help="Registrar cada requisição no terminal")
+    args = parser.parse_args()
+
+    debug_requests = args.log
+    csv_path = find_transcripts_file(args.csv)
+
+    print(f"📂 Carregando e indexando {csv_path}...")
+    server = create_server(csv_path, args.host, args.porta)
+    print(f"🚀 API disponível em http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Encerrando...")
+        server.server_close()
@@ -1,9 +1,24 @@
 import streamlit as st
-import pandas as pd
-import json
-from datetime import datetime
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import sampling
+import transcripts
+from transcripts import (
+    USER_RANKING_ORDERS,
+    compute_statistics_from_index,
+    extract_chat_content,
+    extract_feedback_text,
+    filter_rows,
+    merge_thread_activities,
+    term_rows,
+    top_terms,
+)
+from export_data import EXPORT_DIR, EXPORT_FORMATS, export_conversations, export_output_path
 
 debug = True
+transcripts.debug = debug
 
 # Configuração da página
 st.set_page_config(page_title="Visualizador de Transcrições", layout="wide", page_icon="💬")
@@ -13,172 +28,27 @@ st.set_page_config(page_title="Visualizador de Transcrições", layout="wide", p
 # FUNÇÕES DE CACHE E OTIMIZAÇÃO
 # ============================================================================
 
-@st.cache_data(show_spinner=False)
-def load_csv_data(csv_path):
-    """Carrega o CSV uma única vez e cacheia."""
-    if debug: print("Carregando CSV...")
-    return pd.read_csv(csv_path)
-
-
-@st.cache_data(show_spinner=False)
-def parse_all_json_content(df_content_series):
+@st.cache_resource(show_spinner=False)
+def start_full_ingestion(csv_path):
     """
-    Parseia todos os JSONs do CSV uma única vez.
-    Retorna um dicionário {índice: dados_parseados}.
+    Inicia o pipeline de ingestão (transcripts.load_dataset) em segundo plano,
+    uma única vez, e retorna o Future com o dataset. O resultado é
+    compartilhado entre reruns e fragmentos, sem copiar o DataFrame a cada
+    interação.
     """
-    if debug: print("Parseando todos os JSONs do CSV...")
-    parsed_data = {}
-    for idx, content in enumerate(df_content_series):
-        try:
-            if pd.notna(content):
-                parsed_data[idx] = json.loads(content)
-            else:
-                parsed_data[idx] = None
-        except json.JSONDecodeError:
-            parsed_data[idx] = None
-    return parsed_data
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingestao")
+    return executor.submit(transcripts.load_dataset, csv_path)
 
 
-@st.cache_data(show_spinner=False)
-def build_global_id_map(df_content_series):
+@st.cache_data(show_spinner="Amostrando dados...")
+def approximate_statistics(csv_path):
     """
-    Constrói um mapa global de TODOS os IDs de mensagens do CSV inteiro.
-    Retorna: {message_id: {'rows': [lista de índices], 'type': tipo, 'text': texto}}
-    
-    Isso permite buscar mensagens que estão em OUTRAS linhas do CSV.
+    Estatísticas aproximadas (com intervalos de 95%) a partir de uma amostra
+    reprodutível, exibidas enquanto a ingestão completa não termina.
     """
-    if debug: print("Construindo mapa global de IDs...")
-    global_id_map = {}
-    
-    for idx, content in enumerate(df_content_series):
-        try:
-            if pd.isna(content):
-                continue
-            data = json.loads(content)
-            activities = data.get('activities', [])
-            
-            for activity in activities:
-                activity_id = activity.get('id')
-                if not activity_id:
-                    continue
-                
-                if activity_id not in global_id_map:
-                    global_id_map[activity_id] = {
-                        'rows': [],
-                        'type': activity.get('type'),
-                        'text': activity.get('text', '')[:200] if activity.get('text') else '',
-                        'from_role': activity.get('from', {}).get('role')
-                    }
-                global_id_map[activity_id]['rows'].append(idx)
-        except Exception:
-            continue
-    
-    return global_id_map
+    return sampling.approximate_statistics(csv_path)
 
 
-@st.cache_data(show_spinner=False)
-def compute_feedback_column(df_content_series, _all_feedbacks_map):
-    """
-    Calcula a coluna 'feedback' para todas as linhas de uma vez (cacheado).
-    Retorna uma lista de valores ('POSITIVO', 'NEGATIVO', ou '').
-    """
-    if debug: print("Calculando coluna de feedback...")
-    feedback_values = []
-    
-    for content in df_content_series:
-        try:
-            if pd.isna(content):
-                feedback_values.append('')
-                continue
-                
-            data = json.loads(content)
-            activities = data.get('activities', [])
-            
-            # Coletar IDs de mensagens desta linha
-            message_ids = set()
-            for activity in activities:
-                msg_id = activity.get('id')
-                if not msg_id:
-                    continue
-                if activity.get('type') == 'message':
-                    message_ids.add(msg_id)
-                elif (activity.get('type') == 'trace' and
-                      activity.get('valueType') == 'VariableAssignment' and
-                      activity.get('value', {}).get('name') == 'GeneratedAnswer'):
-                    message_ids.add(msg_id)
-            
-            # Verificar feedbacks
-            has_positive = False
-            has_negative = False
-            for msg_id in message_ids:
-                feedbacks = _all_feedbacks_map.get(msg_id, [])
-                for feedback in feedbacks:
-                    reaction = feedback.get('reaction', '')
-                    if reaction == 'like':
-                        has_positive = True
-                    elif reaction == 'dislike':
-                        has_negative = True
-            
-            if has_negative:
-                feedback_values.append('NEGATIVO')
-            elif has_positive:
-                feedback_values.append('POSITIVO')
-            else:
-                feedback_values.append('')
-        except Exception:
-            feedback_values.append('')
-    
-    return feedback_values
-
-
-@st.cache_data(show_spinner=False)
-def compute_statistics(df_content_series, _all_feedbacks_map):
-    """
-    Calcula estatísticas de feedbacks uma única vez (cacheado).
-    Retorna: (total_positive, total_negative)
-    
-    IMPORTANTE: Conta TODOS os feedbacks do mapa, não apenas os associados
-    a mensagens encontradas nas linhas filtradas.
-    """
-    if debug: print("Calculando estatísticas de feedback...")
-    total_positive = 0
-    total_negative = 0
-    
-    # Coletar IDs de mensagens E traces das linhas filtradas
-    all_message_ids = set()
-    for content in df_content_series:
-        try:
-            if pd.isna(content):
-                continue
-            data = json.loads(content)
-            activities = data.get('activities', [])
-            for activity in activities:
-                msg_id = activity.get('id')
-                if not msg_id:
-                    continue
-                # Mensagem tradicional
-                if activity.get('type') == 'message':
-                    all_message_ids.add(msg_id)
-                # Trace/GeneratedAnswer (também pode receber feedback)
-                elif (activity.get('type') == 'trace' and
-                      activity.get('valueType') == 'VariableAssignment' and
-                      activity.get('value', {}).get('name') == 'GeneratedAnswer'):
-                    all_message_ids.add(msg_id)
-        except:
-            continue
-    
-    # Contar feedbacks para os IDs encontrados
-    for msg_id in all_message_ids:
-        feedbacks = _all_feedbacks_map.get(msg_id, [])
-        for feedback in feedbacks:
-            reaction = feedback.get('reaction', '')
-            if reaction == 'like':
-                total_positive += 1
-            elif reaction == 'dislike':
-                total_negative += 1
-    
-    return total_positive, total_negative
-
 # CSS customizado para mensagens e feedbacks
 st.markdown("""
 <style>
@@ -257,267 +127,6 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-@st.cache_data(show_spinner=False)
-def load_all_feedbacks(df_content_series, _global_id_map):
-    """
-    Carrega TODOS os feedbacks de TODAS as linhas do CSV.
-    Retorna um dicionário mapeando message_id -> lista de feedbacks.
-    
-    LÓGICA DE BUSCA (em ordem de prioridade):
-    1. BUSCA GLOBAL POR ID: Usa o mapa global para encontrar o ID em QUALQUER linha
-    2. BUSCA TEMPORAL (Heurística): Para IDs não encontrados, busca a mensagem de BOT 
-       mais próxima ANTES do feedback NA MESMA LINHA
-    
-    TIPOS DE FEEDBACK CAPTURADOS:
-    - invoke com actionName='feedback' (feedback com texto e reação like/dislike)
-    
-    NOTA: messageReaction não é capturado porque no dataset atual não contém 
-    informação sobre o tipo de reação (like/dislike), apenas que houve interação.
-    """
-    if debug: print("Carregando todos os feedbacks...")
-    all_feedbacks = {}  # {message_id: [lista de feedbacks]}
-    
-    for idx, content in enumerate(df_content_series):
-        try:
-            if pd.isna(content):
-                continue
-            data = json.loads(content)
-            activities = data.get('activities', [])
-            
-            # Ordenar atividades cronologicamente (essencial para heurística temporal)
-            activities.sort(key=lambda x: x.get('timestamp', 0))
-            
-            # ================================================================
-            # Feedbacks invoke (actionName='feedback')
-            # ================================================================
-            for i, activity in enumerate(activities):
-                if (activity.get('type') == 'invoke' and 
-                    activity.get('name') == 'message/submitAction'):
-                    
-                    value = activity.get('value', {})
-                    if value.get('actionName') == 'feedback':
-                        target_msg_id = activity.get('replyToId')
-                        found_msg_id = None
-                        metodo = None
-                        
-                        # TENTATIVA 1: Busca GLOBAL por ID (em TODAS as linhas)
-                        if target_msg_id and target_msg_id in _global_id_map:
-                            found_msg_id = target_msg_id
-                            # Verificar se está na mesma linha ou em outra
-                            rows_with_id = _global_id_map[target_msg_id]['rows']
-                            if idx in rows_with_id:
-                                metodo = 'ID'
-                            else:
-                                metodo = 'ID_CROSS'  # ID encontrado em outra linha
-                        
-                        # TENTATIVA 2: Busca temporal (Heurística) - fallback
-                        # Procura a mensagem de BOT mais próxima ANTES deste feedback
-                        if not found_msg_id:
-                            for j in range(i - 1, -1, -1):
-                                cand = activities[j]
-                                role = cand.get('from', {}).get('role')
-                                cand_id = cand.get('id')
-                                
-                                # Verifica se é mensagem tradicional do Bot (role 0)
-                                is_bot_message = cand.get('type') == 'message' and role == 0
-                                
-                                # Verifica se é trace/GeneratedAnswer do Bot
-                                is_generated_answer = (
-                                    cand.get('type') == 'trace' and
-                                    cand.get('valueType') == 'VariableAssignment' and
-                                    cand.get('value', {}).get('name') == 'GeneratedAnswer' and
-                                    role == 0
-                                )
-                                
-                                if (is_bot_message or is_generated_answer) and cand_id:
-                                    found_msg_id = cand_id
-                                    metodo = 'TEMPO'
-                                    break
-                        
-                        # Se encontrou a mensagem alvo, associar o feedback
-                        if found_msg_id:
-                            if found_msg_id not in all_feedbacks:
-                                all_feedbacks[found_msg_id] = []
-                            
-                            feedback_data = value.get('actionValue', {}).copy()
-                            feedback_data['_metodo_identificacao'] = metodo
-                            all_feedbacks[found_msg_id].append(feedback_data)
-                        
-        except Exception:
-            continue
-    
-    return all_feedbacks
-
-
-def extract_feedback_column(json_string, all_feedbacks_map, _global_id_map):
-    """
-    Retorna POSITIVO, NEGATIVO ou vazio para a coluna feedback.
-    
-    Esta função verifica se as MENSAGENS desta linha receberam feedbacks,
-    independentemente de em qual linha do CSV o feedback está.
-    
-    REGRA: A coluna 'feedback' indica se alguma mensagem DESTA linha
-    recebeu feedback, não se esta linha contém atividades de feedback.
-    """
-    if debug: print("Extraindo coluna de feedback...")
-    try:
-        data = json.loads(json_string)
-        activities = data.get('activities', [])
-        
-        # Coletar IDs de mensagens desta linha
-        message_ids = set()
-        for activity in activities:
-            msg_id = activity.get('id')
-            if not msg_id:
-                continue
-                
-            # Mensagem tradicional
-            if activity.get('type') == 'message':
-                message_ids.add(msg_id)
-            
-            # Trace/GeneratedAnswer do Bot
-            elif (activity.get('type') == 'trace' and
-                  activity.get('valueType') == 'VariableAssignment' and
-                  activity.get('value', {}).get('name') == 'GeneratedAnswer'):
-                message_ids.add(msg_id)
-        
-        # Verificar se alguma mensagem desta linha recebeu feedback
-        has_positive = False
-        has_negative = False
-        
-        for msg_id in message_ids:
-            feedbacks = all_feedbacks_map.get(msg_id, [])
-            for feedback in feedbacks:
-                reaction = feedback.get('reaction', '')
-                if reaction == 'like':
-                    has_positive = True
-                elif reaction == 'dislike':
-                    has_negative = True
-        
-        # Priorizar negativo se houver ambos
-        if has_negative:
-            return 'NEGATIVO'
-        elif has_positive:
-            return 'POSITIVO'
-        else:
-            return ''
-    except Exception:
-        return ''
-
-
-def format_timestamp(timestamp_str):
-    """
-    Formata timestamp para formato legível: HH:MM:SS
-    """
-    try:
-        # Tentar como ISO string
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        return dt.strftime('%H:%M:%S')
-    except:
-        try:
-            # Tentar como timestamp Unix (segundos desde epoch)
-            if isinstance(timestamp_str, (int, float)) or (isinstance(timestamp_str, str) and timestamp_str.isdigit()):
-                dt = datetime.fromtimestamp(int(timestamp_str))
-                return dt.strftime('%H:%M:%S')
-        except:
-            pass
-        return str(timestamp_str)
-
-
-def extract_chat_content(parsed_data, all_feedbacks_map):
-    """
-    Extrai mensagens de UMA linha do CSV (já parseada) e associa feedbacks de TODAS as linhas.
-    
-    Args:
-        parsed_data: Dados JSON já parseados da linha atual
-        all_feedbacks_map: Dicionário com TODOS os feedbacks do CSV inteiro
-    
-    Returns:
-        Lista de mensagens com seus feedbacks associados
-    """
-    if debug: print("Extraindo conteúdo do chat...")
-    try:
-        if parsed_data is None:
-            return []
-            
-        activities = parsed_data.get('activities', [])
-        
-        # Ordenar atividades cronologicamente para exibição correta
-        activities.sort(key=lambda x: x.get('timestamp', 0))
-        
-        # Extrair mensagens desta linha
-        messages = []
-        for activity in activities:
-            msg_id = activity.get('id')
-            text = None
-            is_user = False
-            should_include = False
-            
-            # Mensagem tradicional
-            if activity.get('type') == 'message':
-                text = activity.get('text', '').strip()
-                is_user = activity.get('from', {}).get('role') == 1
-                
-                # Verificar se tem attachments (cards visuais)
-                if not text:
-                    if activity.get('attachments'):
-                        text = "[Conteúdo Visual/Card]"
-                        should_include = True
-                    else:
-                        # Verificar se tem feedback associado (mensagem vazia com feedback)
-                        if msg_id and msg_id in all_feedbacks_map:
-                            text = "[Mensagem sem texto]"
-                            should_include = True
-                else:
-                    should_include = True
-            
-            # Trace/GeneratedAnswer do Bot (nova estrutura)
-            elif (activity.get('type') == 'trace' and
-                  activity.get('valueType') == 'VariableAssignment' and
-                  activity.get('value', {}).get('name') == 'GeneratedAnswer'):
-                text = activity.get('value', {}).get('newValue', '').strip()
-                is_user = False  # GeneratedAnswer é sempre do bot
-                
-                if text:
-                    should_include = True
-                elif msg_id and msg_id in all_feedbacks_map:
-                    # Trace vazio mas com feedback
-                    text = "[Resposta gerada vazia]"
-                    should_include = True
-            
-            # Se encontrou uma mensagem válida ou com feedback, adicionar à lista
-            if should_include and msg_id:
-                # Buscar feedbacks para esta mensagem em TODAS as linhas do CSV
-                feedbacks_for_this_message = all_feedbacks_map.get(msg_id, [])
-                
-                messages.append({
-                    'id': msg_id,
-                    'time': format_timestamp(activity.get('timestamp', '')),
-                    'is_user': is_user,
-                    'text': text,
-                    'feedbacks': feedbacks_for_this_message
-                })
-        
-        return messages
-    except Exception as e:
-        st.error(f"Erro ao processar chat: {str(e)}")
-        return []
-
-
-def extract_feedback_text(feedback_value):
-    """
-    Extrai o texto do feedback do campo 'feedback' que é uma string JSON.
-    """
-    try:
-        feedback_str = feedback_value.get('feedback', '{}')
-        if isinstance(feedback_str, str):
-            feedback_data = json.loads(feedback_str)
-            return feedback_data.get('feedbackText', '[Sem comentário]')
-        return '[Sem comentário]'
-    except:
-        return '[Sem comentário]'
-
-
 def render_chat_message(msg):
     """
     Renderiza uma mensagem do chat com seus feedbacks (se houver).
@@ -580,61 +189,160 @@ def render_chat_message(msg):
             st.markdown(feedback_html, unsafe_allow_html=True)
 
 
-def format_datetime(datetime_str):
+# ============================================================================
+# FRAGMENTOS DA INTERFACE
+# ============================================================================
+# Cada painel é um fragmento: interagir com um widget reexecuta apenas o
+# painel correspondente. Os filtros da sidebar são compartilhados via
+# st.session_state['filters'] e, quando mudam, disparam um rerun completo
+# (barato, pois o dataset já está carregado em load_dataset).
+
+def render_approximate_statistics(csv_path):
     """
-    Formata datetime para AAAA/MM/DD
+    Sidebar provisória: estatísticas aproximadas com intervalos de confiança.
     """
-    try:
-        dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-        return dt.strftime('%Y/%m/%d')
-    except:
-        return datetime_str
+    stats = approximate_statistics(csv_path)
+    
+    st.header("📈 Estatísticas (aproximadas)")
+    st.caption(
+        f"🎲 Amostra de {stats['amostra']} de {stats['populacao']} conversas "
+        f"({stats['fracao']:.1%}), intervalos de 95%. Os números exatos aparecem "
+        f"ao final do carregamento."
+    )
+    st.caption(
+        "ℹ️ Contam apenas feedbacks associados a uma mensagem, como no total exato. "
+        "Feedbacks ligados a mensagens de outra linha (ID_CROSS) são associados "
+        "pela heurística temporal, então podem diferir um pouco do total exato."
+    )
+    
+    def approximate_metric(label, value, suffix='', decimals=0):
+        st.metric(label, f"≈ {value['estimativa']:.{decimals}f}{suffix}")
+        st.caption(
+            f"IC 95%: {value['ic_inferior']:.{decimals}f}{suffix} – {value['ic_superior']:.{decimals}f}{suffix}"
+        )
+    
+    st.metric("Total de Conversas", stats['populacao'])
+    approximate_metric("✅ Feedbacks Positivos", stats['feedbacks_positivos'])
+    approximate_metric("❌ Feedbacks Negativos", stats['feedbacks_negativos'])
+    approximate_metric("📈 Total de Feedbacks", stats['total_feedbacks'])
+    if stats['percentual_positivo']:
+        approximate_metric("Percentual Positivo", stats['percentual_positivo'], '%', 1)
+    approximate_metric("👥 Usuários Distintos", stats['usuarios_distintos'])
 
 
-# ============================================================================
-# APLICAÇÃO PRINCIPAL
-# ============================================================================
+@st.fragment(run_every=2)
+def wait_for_ingestion(ingestion):
+    """
+    Aguarda a ingestão completa; quando termina, refaz o app com os dados exatos.
+    """
+    if ingestion.done():
+        st.rerun()
+    st.info("⏳ Carregando e indexando o dataset completo...")
 
-st.title("📊 Visualizador de Transcrições de Chat")
 
-# Carregar CSV
-try:
-    # Carregar dados com cache (executa só uma vez)
-    df = load_csv_data('conversationtranscripts.csv')
-    
-    # Construir mapa global de IDs (com cache)
-    with st.spinner("Construindo índice de mensagens..."):
-        global_id_map = build_global_id_map(tuple(df['content'].tolist()))
-    
-    # Carregar TODOS os feedbacks do CSV (com cache)
-    with st.spinner("Carregando feedbacks..."):
-        all_feedbacks_global = load_all_feedbacks(
-            tuple(df['content'].tolist()), 
-            global_id_map
+@st.fragment
+def render_sidebar(dataset):
+    """
+    Sidebar: filtros e estatísticas.
+    """
+    df = dataset['df']
+    
+    st.header("⚙️ Configurações")
+    
+    # Filtro de feedback
+    st.subheader("Filtros")
+    only_with_feedback = st.checkbox("Mostrar apenas conversas com feedback")
+    group_threads = st.checkbox(
+        "Agrupar linhas em threads",
+        help="Une linhas do CSV que compartilham IDs de mensagens ou cadeias de resposta"
+    )
+    
+    # Filtro de data
+    selected_date = None
+    if dataset['min_date'] is not None:
+        selected_date = st.date_input(
+            "Data inicial:",
+            value=dataset['min_date'],
+            min_value=dataset['min_date'],
+            max_value=dataset['max_date'],
+            help="Mostra conversas desta data em diante"
         )
     
-    # Parsear todos os JSONs (com cache) para visualização rápida
-    with st.spinner("Preparando dados..."):
-        parsed_json_cache = parse_all_json_content(tuple(df['content'].tolist()))
+    # Filtro de usuário (índice usuário -> linhas)
+    st.subheader("👥 Usuários")
+    user_order = st.radio(
+        "Ordenar usuários por:",
+        options=USER_RANKING_ORDERS,
+        format_func=lambda x: "Atividade" if x == 'activity' else "Taxa de feedback negativo",
+        horizontal=True
+    )
+    user_ranking = dataset['user_rankings'][user_order]
+    selected_user = st.selectbox(
+        "Conversas do usuário:",
+        options=[''] + user_ranking['usuario'].tolist(),
+        format_func=lambda x: "(todos)" if x == '' else x
+    )
     
-    # Adicionar coluna de feedback (CACHEADO)
-    content_tuple = tuple(df['content'].tolist())
-    df['feedback'] = compute_feedback_column(content_tuple, all_feedbacks_global)
+    # Painel de estatísticas (a partir do índice de mensagens por linha)
+    st.subheader("📈 Estatísticas")
     
-    # Formatar conversationstarttime se existir
-    if 'conversationstarttime' in df.columns:
-        df['conversationstarttime_formatted'] = df['conversationstarttime'].apply(format_datetime)
-        # Criar coluna de data (sem hora) para filtro
-        df['conversation_date'] = pd.to_datetime(df['conversationstarttime'], errors='coerce').dt.date
+    # Aplicar filtro de data para estatísticas
+    df_stats = df
+    if selected_date is not None:
+        df_stats = df[df['conversation_date'] >= selected_date]
     
-    # ========================================================================
-    # SIDEBAR - CONTROLES
-    # ========================================================================
+    # Usar o índice da ingestão: sem montar nem hashear tuplas de conteúdo
+    total_positive, total_negative = compute_statistics_from_index(
+        df_stats.index, dataset['row_message_ids'], dataset['all_feedbacks']
+    )
+    
+    total_conversations = len(df_stats)
+    
+    st.metric("Total de Conversas", total_conversations)
+    st.metric("✅ Feedbacks Positivos", total_positive)
+    st.metric("❌ Feedbacks Negativos", total_negative)
+    st.metric("📈 Total de Feedbacks", total_positive + total_negative)
+    
+    if total_positive + total_negative > 0:
+        percentual_positivo = (total_positive / (total_positive + total_negative)) * 100
+        st.metric("Percentual Positivo", f"{percentual_positivo:.1f}%")
+    
+    # Publicar filtros para os outros painéis
+    filters = {
+        'only_with_feedback': only_with_feedback,
+        'group_threads': group_threads,
+        'selected_date': selected_date,
+        'user_order': user_order,
+        'selected_user': selected_user
+    }
+    previous_filters = st.session_state.get('filters')
+    st.session_state['filters'] = filters
+    if previous_filters is not None and previous_filters != filters:
+        # Filtros mudaram: a lista e o chat também precisam ser refeitos
+        st.rerun()
+
+
+@st.fragment
+def render_conversation_list(dataset):
+    """
+    Lista de conversas: aplica os filtros da sidebar e permite escolher as colunas visíveis.
+    """
+    df = dataset['df']
+    user_index = dataset['user_index']
+    filters = st.session_state['filters']
+    group_threads = filters['group_threads']
     
-    st.sidebar.header("⚙️ Configurações")
+    st.header("📋 Lista de Conversas")
+    
+    # Ranking de usuários (montado na ingestão)
+    user_ranking = dataset['user_rankings'][filters['user_order']]
+    with st.expander(f"👥 Usuários ({len(user_ranking)})"):
+        st.dataframe(user_ranking, use_container_width=True, hide_index=True)
+    
+    # Termos mais frequentes nos feedbacks (contagens calculadas na ingestão)
+    selected_term_rows = render_top_terms(dataset['term_index'])
     
     # Seleção de colunas visíveis
-    st.sidebar.subheader("Colunas Visíveis")
     all_columns = [col for col in df.columns if col != 'conversationstarttime']
     
     # Colunas padrão visíveis
@@ -642,135 +350,251 @@ try:
     if 'conversationstarttime_formatted' in df.columns:
         default_visible.insert(1, 'conversationstarttime_formatted')
     
-    visible_columns = st.sidebar.multiselect(
-        "Selecione as colunas:",
+    visible_columns = st.multiselect(
+        "Colunas visíveis:",
         options=all_columns,
         default=[col for col in default_visible if col in all_columns]
     )
     
-    # Filtro de feedback
-    st.sidebar.subheader("Filtros")
-    only_with_feedback = st.sidebar.checkbox("Mostrar apenas conversas com feedback")
+    # Aplicar filtros (usuário selecionado: acesso direto às linhas pelo índice)
+    selected_user = filters['selected_user']
+    if selected_user:
+        user_data = user_index[selected_user]
+        st.caption(
+            f"👤 {selected_user} — {len(user_data['rows'])} conversas, "
+            f"✅ {user_data['likes']} / ❌ {user_data['dislikes']}"
+        )
+    df_display = filter_rows(
+        dataset,
+        only_with_feedback=filters['only_with_feedback'],
+        group_threads=group_threads,
+        start_date=filters['selected_date'],
+        user_id=selected_user,
+        term_rows=selected_term_rows
+    )
     
-    # Filtro de data
-    if 'conversation_date' in df.columns:
-        min_date = df['conversation_date'].min()
-        max_date = df['conversation_date'].max()
+    feedback_column = 'feedback_thread' if group_threads else 'feedback'
+    # Garantir que a coluna de feedback esteja nas colunas visíveis
+    if feedback_column not in visible_columns and len(visible_columns) > 0:
+        visible_columns = [feedback_column] + visible_columns
+    if group_threads and 'linhas_thread' not in visible_columns and len(visible_columns) > 0:
+        visible_columns = ['linhas_thread'] + visible_columns
+    
+    # Mostrar dataframe
+    if len(visible_columns) > 0:
+        # Copiar só as colunas exibidas e adicionar índice original para referência
+        df_table = df_display[visible_columns].copy()
+        df_table.insert(0, '#', df_display.index)
         
-        if pd.notna(min_date) and pd.notna(max_date):
-            selected_date = st.sidebar.date_input(
-                "Data inicial:",
-                value=min_date,
-                min_value=min_date,
-                max_value=max_date,
-                help="Mostra conversas desta data em diante"
+        st.dataframe(
+            df_table,
+            use_container_width=True,
+            hide_index=True
+        )
+    else:
+        st.warning("Selecione pelo menos uma coluna para visualizar.")
+    
+    # Exportação das conversas filtradas (gravada em blocos na pasta de exportações)
+    with st.expander("📤 Exportar conversas filtradas"):
+        col_format, col_path = st.columns([1, 2])
+        with col_format:
+            export_format = st.selectbox("Formato:", options=EXPORT_FORMATS)
+        with col_path:
+            export_filename = st.text_input(
+                f"Arquivo de saída (em `{EXPORT_DIR}/`):",
+                value=f"conversas.{export_format}"
+            )
+        overwrite = st.checkbox("Sobrescrever se o arquivo já existir")
+        
+        if st.button("📤 Exportar"):
+            try:
+                export_path = export_output_path(export_filename)
+                if os.path.exists(export_path) and not overwrite:
+                    raise ValueError(f"`{export_path}` já existe; marque a opção para sobrescrever")
+                os.makedirs(EXPORT_DIR, exist_ok=True)
+                with st.spinner(f"Exportando {len(df_display)} conversas..."):
+                    total = export_conversations(
+                        dataset, df_display.index, export_path, export_format,
+                        group_threads=group_threads
+                    )
+                st.success(f"✅ {total} registros exportados para `{export_path}`")
+            except (ImportError, OSError, ValueError) as e:
+                st.error(f"❌ {str(e)}")
+
+
+def render_top_terms(term_index):
+    """
+    Expander com os termos/bigramas mais frequentes por reação e período.
+    Retorna as linhas do termo escolhido na seleção exibida (reação, fonte e
+    período), para filtrar a lista de conversas, ou None se nenhum foi escolhido.
+    """
+    periods = {'Últimos 7 dias': 7, 'Últimos 30 dias': 30, 'Todo o período': None}
+    
+    with st.expander("🔤 Termos mais frequentes nos feedbacks"):
+        col_reaction, col_period = st.columns([1, 1])
+        with col_reaction:
+            reaction = st.radio(
+                "Reação:",
+                options=['dislike', 'like'],
+                format_func=lambda x: "❌ Negativos" if x == 'dislike' else "✅ Positivos",
+                horizontal=True
+            )
+        with col_period:
+            period = st.selectbox("Período:", options=list(periods))
+        
+        col_kind, col_source = st.columns([1, 1])
+        with col_kind:
+            bigrams = st.radio(
+                "Tipo:",
+                options=[False, True],
+                format_func=lambda x: "Bigramas" if x else "Termos",
+                horizontal=True
+            )
+        with col_source:
+            source = st.radio(
+                "Fonte:",
+                options=['comentario', 'resposta'],
+                format_func=lambda x: "Comentários" if x == 'comentario' else "Respostas avaliadas",
+                horizontal=True
             )
-    
-    # Painel de estatísticas (CACHEADO)
-    st.sidebar.subheader("📈 Estatísticas")
-    
-    # Aplicar filtro de data para estatísticas
-    df_stats = df.copy()
-    if 'conversation_date' in df.columns and pd.notna(min_date) and pd.notna(max_date):
-        df_stats = df_stats[df_stats['conversation_date'] >= selected_date]
-    
-    # Usar função cacheada para calcular estatísticas
-    stats_content_tuple = tuple(df_stats['content'].tolist())
-    total_positive, total_negative = compute_statistics(stats_content_tuple, all_feedbacks_global)
-    
-    total_conversations = len(df_stats)
-    
-    st.sidebar.metric("Total de Conversas", total_conversations)
-    st.sidebar.metric("✅ Feedbacks Positivos", total_positive)
-    st.sidebar.metric("❌ Feedbacks Negativos", total_negative)
-    st.sidebar.metric("📈 Total de Feedbacks", total_positive + total_negative)
-    
-    if total_positive + total_negative > 0:
-        percentual_positivo = (total_positive / (total_positive + total_negative)) * 100
-        st.sidebar.metric("Percentual Positivo", f"{percentual_positivo:.1f}%")
-    
-    # ========================================================================
-    # LAYOUT PRINCIPAL - 2 COLUNAS
-    # ========================================================================
-    
-    col_left, col_right = st.columns([1, 1])
-    
-    with col_left:
-        st.header("📋 Lista de Conversas")
         
-        # Aplicar filtro
-        df_display = df.copy()
-        if only_with_feedback:
-            df_display = df_display[df_display['feedback'] != '']
+        # Período relativo ao último dia com feedback no dataset
+        start_date = None
+        if periods[period] and term_index['days']:
+            last_day = term_index['days'][-1]
+            start_date = last_day - timedelta(days=periods[period] - 1)
+            st.caption(f"De {start_date:%Y/%m/%d} a {last_day:%Y/%m/%d}")
         
-        # Aplicar filtro de data
-        if 'conversation_date' in df.columns and pd.notna(min_date) and pd.notna(max_date):
-            df_display = df_display[df_display['conversation_date'] >= selected_date]
+        ranking = top_terms(term_index, reaction, source, bigrams, start_date=start_date)
+        if not ranking:
+            st.info("Nenhum termo encontrado para esta seleção.")
+            return None
         
-        # Garantir que 'feedback' esteja nas colunas visíveis
-        if 'feedback' not in visible_columns and len(visible_columns) > 0:
-            visible_columns = ['feedback'] + visible_columns
+        st.dataframe(
+            [{'termo': term, 'ocorrências': count, 'conversas': rows} for term, count, rows in ranking],
+            use_container_width=True,
+            hide_index=True
+        )
+        selected_term = st.selectbox(
+            "Filtrar conversas pelo termo:",
+            options=[''] + [term for term, _, _ in ranking],
+            format_func=lambda x: "(nenhum)" if x == '' else x
+        )
+        if not selected_term:
+            return None
+        return term_rows(term_index, selected_term, reaction, source, start_date=start_date)
+
+
+@st.fragment
+def render_chat_view(dataset):
+    """
+    Visualização do chat: seletor de linha e renderização da conversa escolhida.
+    """
+    df = dataset['df']
+    thread_index = dataset['thread_index']
+    parsed_json_cache = dataset['parsed_json']
+    all_feedbacks_global = dataset['all_feedbacks']
+    group_threads = st.session_state['filters']['group_threads']
+    
+    st.header("💬 Visualização do Chat")
+    
+    # Seletor de linha
+    col_input, col_button = st.columns([1, 1], vertical_alignment="bottom")
+    
+    with col_input:
+        selected_index = st.number_input(
+            "Digite o número da linha (#):",
+            min_value=0,
+            max_value=len(df)-1,
+            value=0,
+            step=1
+        )
+    
+    with col_button:
+        if st.button("🔍 Visualizar Conversa", type="primary"):
+            st.session_state['selected_row'] = selected_index
+    
+    if 'selected_row' in st.session_state:
+        row_idx = st.session_state['selected_row']
         
-        # Mostrar dataframe
-        if len(visible_columns) > 0:
-            # Adicionar coluna de índice original para referência
-            df_display['#'] = df_display.index
-            display_cols = ['#'] + visible_columns
-            
-            st.dataframe(
-                df_display[display_cols],
-                use_container_width=True,
-                hide_index=True
+        # Mostrar número da linha (ou linhas da thread)
+        thread_rows = thread_index['threads'][thread_index['row_to_thread'][row_idx]]
+        if group_threads and len(thread_rows) > 1:
+            st.markdown(
+                f'<div class="row-number">🧵 THREAD #{thread_rows[0]} — LINHAS {", ".join(f"#{r}" for r in thread_rows)}</div>',
+                unsafe_allow_html=True
             )
-            
-            # Seletor de linha
-            st.subheader("Selecione uma conversa para visualizar")
-            
-            col_input, col_spacer = st.columns([1, 2])
-            
-            with col_input:
-                selected_index = st.number_input(
-                    "Digite o número da linha (#):",
-                    min_value=0,
-                    max_value=len(df)-1,
-                    value=0,
-                    step=1
-                )
-            
-            if st.button("🔍 Visualizar Conversa", type="primary"):
-                st.session_state['selected_row'] = selected_index
         else:
-            st.warning("Selecione pelo menos uma coluna para visualizar.")
-    
-    with col_right:
-        st.header("💬 Visualização do Chat")
-        
-        if 'selected_row' in st.session_state:
-            row_idx = st.session_state['selected_row']
-            
-            # Mostrar número da linha
             st.markdown(
                 f'<div class="row-number">📍 LINHA #{row_idx}</div>',
                 unsafe_allow_html=True
             )
-            
-            # Extrair mensagens usando o cache de JSON parseado
+        
+        # Extrair mensagens usando o cache de JSON parseado
+        if group_threads:
+            parsed_data = merge_thread_activities(thread_rows, parsed_json_cache)
+        else:
             parsed_data = parsed_json_cache.get(row_idx)
+        try:
             messages = extract_chat_content(parsed_data, all_feedbacks_global)
+        except ValueError as e:
+            st.error(str(e))
+            messages = []
+        
+        if messages:
+            st.info(f"**Total de mensagens:** {len(messages)}")
             
-            if messages:
-                st.info(f"**Total de mensagens:** {len(messages)}")
-                
-                # Renderizar cada mensagem
-                for msg in messages:
-                    render_chat_message(msg)
-            else:
-                st.warning("Nenhuma mensagem encontrada nesta conversa.")
+            # Renderizar cada mensagem
+            for msg in messages:
+                render_chat_message(msg)
         else:
-            st.info("👈 Selecione uma conversa na lista à esquerda e clique em 'Visualizar Conversa'")
+            st.warning("Nenhuma mensagem encontrada nesta conversa.")
+    else:
+        st.info("☝️ Digite o número da linha (#) da lista e clique em 'Visualizar Conversa'")
+
+
+# ============================================================================
+# APLICAÇÃO PRINCIPAL
+# ============================================================================
+
+st.title("📊 Visualizador de Transcrições de Chat")
+
+# Carregar CSV
+try:
+    # Carregar e indexar dados em segundo plano (executa só uma vez, compartilhado entre reruns)
+    csv_path = transcripts.find_transcripts_file()
+    ingestion = start_full_ingestion(csv_path)
+    
+    # Enquanto a ingestão não termina: estatísticas aproximadas por amostragem
+    if not ingestion.done():
+        with st.sidebar:
+            render_approximate_statistics(csv_path)
+        wait_for_ingestion(ingestion)
+        st.stop()
+    
+    if ingestion.exception() is not None:
+        # Permitir nova tentativa no próximo rerun
+        start_full_ingestion.clear()
+    dataset = ingestion.result()
+    
+    # Sidebar primeiro: publica os filtros usados pelos outros painéis
+    with st.sidebar:
+        render_sidebar(dataset)
+    
+    # ========================================================================
+    # LAYOUT PRINCIPAL - 2 COLUNAS
+    # ========================================================================
+    
+    col_left, col_right = st.columns([1, 1])
+    
+    with col_left:
+        render_conversation_list(dataset)
+    
+    with col_right:
+        render_chat_view(dataset)
 
 except FileNotFoundError:
-    st.error("❌ Arquivo 'conversationtranscripts.csv' não encontrado!")
+    st.error("❌ Arquivo 'conversationtranscripts.csv' (ou .csv.gz/.csv.zst/.csv.bz2) não encontrado!")
     st.info("Certifique-se de que o arquivo está no mesmo diretório que app.py")
 except Exception as e:
     st.error(f"❌ Erro ao carregar dados: {str(e)}")
@@ -2,53 +2,62 @@ import pandas as pd
 import json
 from datetime import datetime
 
+from transcripts import find_transcripts_file, read_csv_chunks
+
 
 def count_distinct_users(csv_path: str, start_date: str) -> dict:
     """
     Conta usuários distintos no CSV de transcrições a partir de uma data.
     
+    O CSV é lido em blocos (aceita .csv.gz, .csv.zst e .csv.bz2), então
+    o arquivo nunca é carregado inteiro em memória.
+    
     Args:
-        csv_path: Caminho para o arquivo CSV
+        csv_path: Caminho para o arquivo CSV (simples ou compactado)
         start_date: Data inicial no formato 'YYYY-MM-DD' (ex: '2025-01-01')
     
     Returns:
         Dicionário com estatísticas dos usuários
     """
-    df = pd.read_csv(csv_path)
-    
     # Converter data de filtro
     filter_date = datetime.strptime(start_date, '%Y-%m-%d').date()
     
-    # Filtrar por data se a coluna existir
-    if 'conversationstarttime' in df.columns:
-        df['conversation_date'] = pd.to_datetime(df['conversationstarttime'], errors='coerce').dt.date
-        df = df[df['conversation_date'] >= filter_date]
-    
     # Set para armazenar IDs únicos de usuários
     distinct_users = set()
+    total_conversations = 0
     
-    # Processar cada linha do CSV
-    for _, row in df.iterrows():
-        try:
-            data = json.loads(row['content'])
-            activities = data.get('activities', [])
-            
-            for activity in activities:
-                from_data = activity.get('from', {})
-                role = from_data.get('role')
-                user_id = from_data.get('aadObjectId')
+    # Ler apenas as colunas necessárias, bloco a bloco
+    chunks = read_csv_chunks(csv_path, usecols=lambda col: col in ('content', 'conversationstarttime'))
+    for df in chunks:
+        # Filtrar por data se a coluna existir
+        if 'conversationstarttime' in df.columns:
+            df['conversation_date'] = pd.to_datetime(df['conversationstarttime'], errors='coerce').dt.date
+            df = df[df['conversation_date'] >= filter_date]
+        
+        total_conversations += len(df)
+        
+        # Processar cada linha do bloco
+        for content in df['content']:
+            try:
+                data = json.loads(content)
+                activities = data.get('activities', [])
                 
-                # Verificar se é um usuário (role == 1) e tem ID
-                if role == 1 and user_id:
-                    distinct_users.add(user_id)
+                for activity in activities:
+                    from_data = activity.get('from', {})
+                    role = from_data.get('role')
+                    user_id = from_data.get('aadObjectId')
                     
-        except Exception as e:
-            continue
+                    # Verificar se é um usuário (role == 1) e tem ID
+                    if role == 1 and user_id:
+                        distinct_users.add(user_id)
+                        
+            except Exception as e:
+                continue
     
     return {
         'total_usuarios_distintos': len(distinct_users),
         'data_inicial': start_date,
-        'total_conversas_analisadas': len(df),
+        'total_conversas_analisadas': total_conversations,
         'lista_ids': list(distinct_users)
     }
 
@@ -59,7 +68,8 @@ if __name__ == "__main__":
     # =====================================================
     DATA_INICIAL = "2025-12-15"  # Formato: YYYY-MM-DD
     
-    CSV_PATH = "conversationtranscripts.csv"
+    # Aceita também conversationtranscripts.csv.gz / .csv.zst / .csv.bz2
+    CSV_PATH = find_transcripts_file("conversationtranscripts.csv")
     
     print(f"🔍 Contando usuários distintos desde {DATA_INICIAL}...")
     print("-" * 50)
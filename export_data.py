@@ -0,0 +1,235 @@
+"""
+Exportação em streaming das conversas filtradas para CSV, Parquet ou JSONL.
+
+Cada registro é uma mensagem (achatada) com a linha/thread de origem e um
+feedback resolvido; mensagens com vários feedbacks geram um registro por
+feedback. Os registros são gerados sob demanda e gravados em blocos, então
+a exportação nunca é montada inteira em memória.
+"""
+import argparse
+import csv
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+from transcripts import (
+    TRANSCRIPTS_FILENAME,
+    extract_chat_content,
+    extract_feedback_text,
+    filter_rows,
+    find_transcripts_file,
+    load_dataset,
+    merge_thread_activities,
+)
+
+
+EXPORT_FIELDS = [
+    'linha',
+    'thread',
+    'conversationstarttime',
+    'feedback_linha',
+    'mensagem_id',
+    'timestamp',
+    'autor',
+    'texto',
+    'feedback_numero',
+    'reacao',
+    'comentario',
+    'metodo_identificacao',
+]
+
+EXPORT_FORMATS = ('csv', 'parquet', 'jsonl')
+
+DEFAULT_CHUNK_SIZE = 10000
+
+# Pasta onde o app grava as exportações (o app não grava fora dela)
+EXPORT_DIR = 'exports'
+
+
+def iter_export_records(dataset, rows, group_threads=False):
+    """
+    Gera os registros de exportação, um por mensagem/feedback, linha a linha.
+
+    Args:
+        dataset: Dataset retornado por transcripts.load_dataset
+        rows: Índices das linhas a exportar (ex: resultado de filter_rows)
+        group_threads: Se True, cada linha é a raiz de uma thread e as
+                       mensagens de todas as linhas da thread são exportadas juntas
+    """
+    df = dataset['df']
+    thread_index = dataset['thread_index']
+    has_start_time = 'conversationstarttime' in df.columns
+    feedback_column = 'feedback_thread' if group_threads else 'feedback'
+
+    for row_idx in rows:
+        thread_id = thread_index['row_to_thread'][row_idx]
+        if group_threads:
+            parsed_data = merge_thread_activities(thread_index['threads'][thread_id], dataset['parsed_json'])
+        else:
+            parsed_data = dataset['parsed_json'].get(row_idx)
+
+        try:
+            messages = extract_chat_content(parsed_data, dataset['all_feedbacks'])
+        except ValueError:
+            continue
+
+        start_time = df.at[row_idx, 'conversationstarttime'] if has_start_time else None
+        row_fields = {
+            'linha': int(row_idx),
+            'thread': int(thread_id),
+            'conversationstarttime': '' if pd.isna(start_time) else str(start_time),
+            'feedback_linha': df.at[row_idx, feedback_column],
+        }
+
+        for msg in messages:
+            message_fields = dict(row_fields)
+            message_fields.update({
+                'mensagem_id': msg['id'],
+                'timestamp': str(msg['timestamp']),
+                'autor': 'USUARIO' if msg['is_user'] else 'BOT',
+                'texto': msg['text'],
+            })
+
+            if not msg['feedbacks']:
+                message_fields.update({
+                    'feedback_numero': None,
+                    'reacao': '',
+                    'comentario': '',
+                    'metodo_identificacao': '',
+                })
+                yield message_fields
+                continue
+
+            for number, feedback in enumerate(msg['feedbacks'], 1):
+                record = dict(message_fields)
+                record.update({
+                    'feedback_numero': number,
+                    'reacao': feedback.get('reaction', ''),
+                    'comentario': extract_feedback_text(feedback),
+                    'metodo_identificacao': feedback.get('_metodo_identificacao', ''),
+                })
+                yield record
+
+
+def iter_chunks(records, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Agrupa um iterador de registros em listas de até chunk_size registros.
+    """
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv(records, output_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Grava os registros em CSV, bloco a bloco. Retorna o total de registros."""
+    total = 0
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for chunk in iter_chunks(records, chunk_size):
+            writer.writerows(chunk)
+            total += len(chunk)
+    return total
+
+
+def write_jsonl(records, output_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Grava os registros em JSONL (um objeto por linha), bloco a bloco. Retorna o total de registros."""
+    total = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for chunk in iter_chunks(records, chunk_size):
+            f.write(''.join(json.dumps(record, ensure_ascii=False) + '\n' for record in chunk))
+            total += len(chunk)
+    return total
+
+
+def write_parquet(records, output_path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Grava os registros em Parquet, um row group por bloco. Retorna o total de registros.
+    Requer pyarrow (pip install pyarrow).
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise ImportError("Exportação em Parquet requer pyarrow: pip install pyarrow") from e
+
+    schema = pa.schema([
+        (field, pa.int64() if field in ('linha', 'thread', 'feedback_numero') else pa.string())
+        for field in EXPORT_FIELDS
+    ])
+
+    total = 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        for chunk in iter_chunks(records, chunk_size):
+            writer.write_table(pa.Table.from_pylist(chunk, schema=schema))
+            total += len(chunk)
+    return total
+
+
+def export_output_path(filename, export_dir=EXPORT_DIR):
+    """
+    Caminho de saída dentro da pasta de exportações para um nome de arquivo
+    informado na interface. Lança ValueError para nomes vazios, com
+    separadores de diretório ou '..'.
+    """
+    filename = filename.strip()
+    if not filename or filename == '.' or '..' in filename or '/' in filename or '\\' in filename:
+        raise ValueError(f"Nome de arquivo inválido: '{filename}' (use apenas o nome, sem pastas)")
+    return os.path.join(export_dir, filename)
+
+
+def export_conversations(dataset, rows, output_path, export_format='csv',
+                         group_threads=False, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Exporta as conversas das linhas informadas no formato escolhido.
+    Retorna o total de registros gravados.
+    """
+    writers = {'csv': write_csv, 'parquet': write_parquet, 'jsonl': write_jsonl}
+    if export_format not in writers:
+        raise ValueError(f"Formato inválido: {export_format} (use {', '.join(EXPORT_FORMATS)})")
+
+    records = iter_export_records(dataset, rows, group_threads)
+    return writers[export_format](records, output_path, chunk_size)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta conversas filtradas com seus feedbacks.")
+    parser.add_argument('saida', help="Arquivo de saída (ex: conversas.csv, conversas.parquet, conversas.jsonl)")
+    parser.add_argument('--csv', default=TRANSCRIPTS_FILENAME,
+                        help="CSV de transcrições de entrada (aceita .csv.gz, .csv.zst, .csv.bz2)")
+    parser.add_argument('--formato', choices=EXPORT_FORMATS,
+                        help="Formato de saída (padrão: extensão do arquivo de saída)")
+    parser.add_argument('--desde', help="Data inicial no formato YYYY-MM-DD")
+    parser.add_argument('--apenas-feedback', action='store_true', help="Apenas conversas com feedback")
+    parser.add_argument('--threads', action='store_true', help="Agrupar linhas em threads")
+    parser.add_argument('--usuario', help="aadObjectId do usuário")
+    parser.add_argument('--bloco', type=int, default=DEFAULT_CHUNK_SIZE, help="Registros por bloco gravado")
+    args = parser.parse_args()
+
+    export_format = args.formato or args.saida.rsplit('.', 1)[-1].lower()
+    start_date = datetime.strptime(args.desde, '%Y-%m-%d').date() if args.desde else None
+
+    csv_path = find_transcripts_file(args.csv)
+    print(f"📂 Carregando {csv_path}...")
+    dataset = load_dataset(csv_path)
+    df_filtered = filter_rows(
+        dataset,
+        only_with_feedback=args.apenas_feedback,
+        group_threads=args.threads,
+        start_date=start_date,
+        user_id=args.usuario
+    )
+
+    print(f"📤 Exportando {len(df_filtered)} conversas para {args.saida} ({export_format})...")
+    total = export_conversations(
+        dataset, df_filtered.index, args.saida, export_format,
+        group_threads=args.threads, chunk_size=args.bloco
+    )
+    print(f"✅ {total} registros exportados")
@@ -0,0 +1,406 @@
+"""
+Estatísticas aproximadas a partir de uma amostra reprodutível das linhas do CSV.
+
+A amostra é sorteada antes da leitura do conteúdo: o pandas descarta as
+linhas fora da amostra durante a tokenização (skiprows), sem materializar
+nem parsear o JSON delas, que é a maior parte do custo da ingestão completa. Reporta feedbacks positivos e
+negativos, percentual positivo e usuários distintos com intervalos de
+confiança, enquanto a ingestão completa (transcripts.load_dataset) não termina.
+
+Métodos de amostragem:
+- 'aleatoria': cada linha entra na amostra com probabilidade `fraction`
+- 'estratificada': por data de conversationstarttime, a mesma fração de
+  cada dia (pelo menos uma linha por dia); exige uma leitura extra, apenas da
+  coluna de data, para sortear as linhas antes de ler o conteúdo
+
+Como a contagem exata (transcripts.load_all_feedbacks), só são contados os
+feedbacks associados a uma mensagem: pelo replyToId ou, na falta dele, pela
+mensagem do bot anterior. A amostra só enxerga a própria linha, então um
+feedback cujo replyToId aponta para outra linha (ID_CROSS) é contado pela
+heurística temporal: a estimativa é aproximada nesses casos.
+"""
+import argparse
+import json
+import math
+import random
+from array import array
+
+import pandas as pd
+
+from transcripts import TRANSCRIPTS_FILENAME, find_transcripts_file, read_csv_chunks
+
+
+SAMPLE_FRACTION = 0.02
+SAMPLE_SEED = 42
+SAMPLE_METHODS = ('aleatoria', 'estratificada')
+
+# Quantil da normal para intervalos de 95%
+Z_95 = 1.96
+
+# Limite superior de 95% para uma contagem de Poisson com zero ocorrências ("regra de três")
+ZERO_COUNT_UPPER = 3.0
+
+
+def _row_dates(df):
+    """Datas (sem hora) das conversas do bloco, ou None quando não há a coluna."""
+    if 'conversationstarttime' not in df.columns:
+        return [None] * len(df)
+    return pd.to_datetime(df['conversationstarttime'], errors='coerce').dt.date.tolist()
+
+
+def _rows_per_date(csv_path):
+    """
+    Primeira leitura da amostragem estratificada (só a coluna de data).
+    Retorna {data: array com os índices das linhas daquela data}.
+    """
+    rows_by_date = {}
+    row_idx = 0
+    chunks = read_csv_chunks(csv_path, usecols=lambda col: col == 'conversationstarttime')
+    for df in chunks:
+        for date in _row_dates(df):
+            date = None if pd.isna(date) else date
+            if date not in rows_by_date:
+                rows_by_date[date] = array('l')
+            rows_by_date[date].append(row_idx)
+            row_idx += 1
+    return rows_by_date
+
+
+def _is_feedback_activity(activity):
+    return (activity.get('type') == 'invoke' and
+            activity.get('name') == 'message/submitAction' and
+            activity.get('value', {}).get('actionName') == 'feedback')
+
+
+def _is_feedback_target(activity):
+    """Mensagem que pode receber feedback (mesma regra de transcripts.build_row_message_ids)."""
+    return bool(activity.get('id')) and (
+        activity.get('type') == 'message' or
+        (activity.get('type') == 'trace' and
+         activity.get('valueType') == 'VariableAssignment' and
+         activity.get('value', {}).get('name') == 'GeneratedAnswer')
+    )
+
+
+def summarize_row(content):
+    """
+    Resume uma linha da amostra.
+    Retorna (likes, dislikes, usuários) contando cada atividade de feedback uma
+    vez e apenas os feedbacks que a ingestão completa associa a uma mensagem:
+    replyToId de uma mensagem da linha ou, se o replyToId não está na linha,
+    a mensagem do bot anterior (busca temporal).
+    """
+    likes = 0
+    dislikes = 0
+    users = set()
+    try:
+        if pd.isna(content):
+            return likes, dislikes, users
+        data = json.loads(content)
+        activities = sorted(data.get('activities', []), key=lambda x: x.get('timestamp', 0))
+        row_ids = {activity.get('id') for activity in activities if activity.get('id')}
+        target_ids = {activity['id'] for activity in activities if _is_feedback_target(activity)}
+        seen_feedback_ids = set()
+        for i, activity in enumerate(activities):
+            from_data = activity.get('from', {})
+            if from_data.get('role') == 1 and from_data.get('aadObjectId'):
+                users.add(from_data['aadObjectId'])
+
+            if not _is_feedback_activity(activity):
+                continue
+
+            activity_id = activity.get('id')
+            if activity_id:
+                if activity_id in seen_feedback_ids:
+                    continue
+                seen_feedback_ids.add(activity_id)
+
+            reply_to = activity.get('replyToId')
+            if reply_to and reply_to in row_ids:
+                resolved = reply_to in target_ids
+            else:
+                resolved = any(
+                    _is_feedback_target(cand) and cand.get('from', {}).get('role') == 0
+                    for cand in activities[:i]
+                )
+            if not resolved:
+                continue
+
+            reaction = activity.get('value', {}).get('actionValue', {}).get('reaction', '')
+            if reaction == 'like':
+                likes += 1
+            elif reaction == 'dislike':
+                dislikes += 1
+    except Exception:
+        pass
+    return likes, dislikes, users
+
+
+def read_sample(csv_path, fraction=SAMPLE_FRACTION, seed=SAMPLE_SEED, method='aleatoria'):
+    """
+    Lê uma amostra reprodutível das linhas do CSV (mesma semente, mesma amostra).
+
+    Returns:
+        Dicionário {'strata': {estrato: {'N': linhas, 'rows': [(likes, dislikes)]}},
+                    'user_rows': {usuário: nº de linhas da amostra em que aparece},
+                    'method': método}
+    """
+    if method not in SAMPLE_METHODS:
+        raise ValueError(f"Método inválido: {method} (use {', '.join(SAMPLE_METHODS)})")
+
+    rng = random.Random(seed)
+    strata = {}
+    user_rows = {}
+
+    # skiprows recebe o índice do registro no arquivo (0 = cabeçalho), uma vez
+    # por registro e em ordem; as linhas descartadas não chegam a ser materializadas
+    if method == 'estratificada':
+        # Sortear de antemão as linhas (dentro de cada data) que entram na amostra
+        selected_records = set()
+        for date, rows in sorted(_rows_per_date(csv_path).items(), key=lambda item: (item[0] is None, item[0])):
+            quota = min(len(rows), max(1, round(len(rows) * fraction)))
+            for position in rng.sample(range(len(rows)), quota):
+                selected_records.add(rows[position] + 1)
+            strata[date] = {'N': len(rows), 'rows': []}
+
+        def skip_row(record):
+            return record > 0 and record not in selected_records
+    else:
+        # Sorteio linha a linha, na ordem do arquivo (mesma semente, mesma amostra)
+        draw = {'record': 0, 'selected': False}
+        strata[None] = {'N': 0, 'rows': []}
+
+        def skip_row(record):
+            if record == 0:
+                return False
+            if record != draw['record']:
+                draw['record'] = record
+                draw['selected'] = rng.random() < fraction
+            return not draw['selected']
+
+    chunks = read_csv_chunks(csv_path, usecols=lambda col: col in ('content', 'conversationstarttime'),
+                             skiprows=skip_row)
+    for df in chunks:
+        dates = _row_dates(df) if method == 'estratificada' else [None] * len(df)
+        for content, date in zip(df['content'], dates):
+            if method == 'estratificada':
+                date = None if pd.isna(date) else date
+            likes, dislikes, users = summarize_row(content)
+            strata[date]['rows'].append((likes, dislikes))
+            for user_id in users:
+                user_rows[user_id] = user_rows.get(user_id, 0) + 1
+
+    if method != 'estratificada':
+        # Linhas da população: último registro visto pelo sorteio
+        strata[None]['N'] = draw['record']
+
+    return {'strata': strata, 'user_rows': user_rows, 'method': method}
+
+
+def _interval(estimate, standard_error, lower_bound=0.0, upper_bound=None):
+    """Intervalo normal de 95% (limitado aos valores possíveis)."""
+    lower = max(lower_bound, estimate - Z_95 * standard_error)
+    upper = estimate + Z_95 * standard_error
+    if upper_bound is not None:
+        upper = min(upper_bound, upper)
+    return {'estimativa': estimate, 'ic_inferior': lower, 'ic_superior': upper}
+
+
+def _wilson_interval(proportion, n):
+    """
+    Intervalo de Wilson de 95% para uma proporção observada em n casos.
+    Não colapsa quando a proporção é 0 ou 1, ao contrário do intervalo normal.
+    """
+    denominator = 1 + Z_95 ** 2 / n
+    center = (proportion + Z_95 ** 2 / (2 * n)) / denominator
+    half_width = Z_95 * math.sqrt(proportion * (1 - proportion) / n + Z_95 ** 2 / (4 * n ** 2)) / denominator
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+
+def _collapsed_strata_variance(singletons, pooled_sample_var):
+    """
+    Variância dos estratos com uma só linha na amostra, que não permitem
+    estimar a variância dentro do estrato. Com dois ou mais, usa o estimador
+    de estratos colapsados (Cochran, 5A.12) sobre os totais Y_h = N_h · y_h:
+    L/(L-1) · Σ (Y_h - N_h/N_G · Y_G)². Com um só, usa a variância dentro dos
+    demais estratos. A estimativa pontual de cada estrato não muda.
+
+    Args:
+        singletons: [(N_h, Y_h)] dos estratos com uma linha na amostra
+        pooled_sample_var: Variância amostral combinada dos demais estratos (ou None)
+    """
+    if len(singletons) >= 2:
+        L = len(singletons)
+        N_group = sum(N for N, _ in singletons)
+        Y_group = sum(Y for _, Y in singletons)
+        return L / (L - 1) * sum((Y - N / N_group * Y_group) ** 2 for N, Y in singletons)
+    if singletons and pooled_sample_var is not None:
+        N, _ = singletons[0]
+        return N ** 2 * (1 - 1 / N) * pooled_sample_var
+    return 0.0
+
+
+def _estimate_total(strata, value):
+    """
+    Estimador de total estratificado: soma de N_h · ȳ_h de cada estrato.
+    Retorna (total, variância).
+
+    Estratos recenseados (n_h = N_h) não têm variância amostral; os com uma
+    só linha na amostra (dias pequenos na estratificada) entram na variância
+    por _collapsed_strata_variance.
+    """
+    total = 0.0
+    variance = 0.0
+    singletons = []
+    squares_sum = 0.0
+    degrees_of_freedom = 0
+    for stratum in strata.values():
+        values = [value(row) for row in stratum['rows']]
+        n = len(values)
+        if n == 0:
+            continue
+        N = stratum['N']
+        mean = sum(values) / n
+        total += N * mean
+        if n == 1:
+            if N > 1:
+                singletons.append((N, N * mean))
+            continue
+        squares = sum((v - mean) ** 2 for v in values)
+        squares_sum += squares
+        degrees_of_freedom += n - 1
+        variance += N ** 2 * (1 - n / N) * squares / (n - 1) / n
+
+    pooled_sample_var = squares_sum / degrees_of_freedom if degrees_of_freedom else None
+    variance += _collapsed_strata_variance(singletons, pooled_sample_var)
+    return total, variance
+
+
+def _total_interval(strata, value, n, N):
+    """
+    Total estimado com intervalo de 95%. Se nenhuma linha da amostra tem a
+    contagem, usa a regra de três (limite superior de 3 ocorrências na
+    amostra, expandido pela fração amostral) em vez de um intervalo [0, 0],
+    exceto quando a amostra é o dataset inteiro.
+    """
+    total, variance = _estimate_total(strata, value)
+    if total == 0 and 0 < n < N:
+        return {'estimativa': 0.0, 'ic_inferior': 0.0, 'ic_superior': ZERO_COUNT_UPPER * N / n}
+    return _interval(total, math.sqrt(variance))
+
+
+def _estimate_distinct_users(user_rows, n, census=False):
+    """
+    Estimador Chao2 (corrigido de viés) do número de usuários distintos, a
+    partir da incidência dos usuários nas n linhas da amostra, com intervalo
+    de 95% log-transformado (Chao, 1987). Com census=True (amostra = dataset
+    inteiro), retorna a contagem observada.
+    """
+    observed = len(user_rows)
+    q1 = sum(1 for count in user_rows.values() if count == 1)
+    q2 = sum(1 for count in user_rows.values() if count == 2)
+    if census or n <= 1 or q1 == 0:
+        return {'estimativa': float(observed), 'ic_inferior': float(observed), 'ic_superior': float(observed)}
+
+    a = (n - 1) / n
+    unseen = a * q1 * (q1 - 1) / (2 * (q2 + 1))
+    variance = (
+        a * q1 * (q1 - 1) / (2 * (q2 + 1)) +
+        a ** 2 * q1 * (2 * q1 - 1) ** 2 / (4 * (q2 + 1) ** 2) +
+        a ** 2 * q1 ** 2 * q2 * (q1 - 1) ** 2 / (4 * (q2 + 1) ** 4)
+    )
+    if unseen <= 0:
+        return {'estimativa': float(observed), 'ic_inferior': float(observed), 'ic_superior': float(observed)}
+
+    k = math.exp(Z_95 * math.sqrt(math.log(1 + variance / unseen ** 2)))
+    return {
+        'estimativa': observed + unseen,
+        'ic_inferior': observed + unseen / k,
+        'ic_superior': observed + unseen * k
+    }
+
+
+def estimate_statistics(sample):
+    """
+    Calcula as estatísticas aproximadas (intervalos de 95%) a partir da amostra.
+
+    Returns:
+        Dicionário com 'feedbacks_positivos', 'feedbacks_negativos',
+        'total_feedbacks', 'percentual_positivo' e 'usuarios_distintos'
+        (cada um {'estimativa', 'ic_inferior', 'ic_superior'}), além do
+        tamanho da amostra e da população.
+    """
+    strata = sample['strata']
+    n = sum(len(stratum['rows']) for stratum in strata.values())
+    N = sum(stratum['N'] for stratum in strata.values())
+
+    likes = _total_interval(strata, lambda row: row[0], n, N)
+    dislikes = _total_interval(strata, lambda row: row[1], n, N)
+    total = _total_interval(strata, lambda row: row[0] + row[1], n, N)
+
+    # Percentual positivo: estimador de razão; intervalo de Wilson com o tamanho
+    # efetivo da amostra (pela variância linearizada), ou com o nº de feedbacks
+    # da amostra quando a variância é nula (ex: nenhum dislike na amostra).
+    # Se a amostra é o dataset inteiro, o percentual é exato.
+    if total['estimativa'] > 0:
+        ratio = likes['estimativa'] / total['estimativa']
+        _, residual_var = _estimate_total(strata, lambda row: row[0] - ratio * (row[0] + row[1]))
+        ratio_var = residual_var / total['estimativa'] ** 2
+        sampled_feedbacks = sum(row[0] + row[1] for stratum in strata.values() for row in stratum['rows'])
+        if n >= N:
+            lower, upper = ratio, ratio
+        else:
+            if ratio_var > 0 and 0 < ratio < 1:
+                effective_n = ratio * (1 - ratio) / ratio_var
+            else:
+                effective_n = sampled_feedbacks
+            lower, upper = _wilson_interval(ratio, effective_n)
+        positive_rate = {'estimativa': ratio * 100, 'ic_inferior': lower * 100, 'ic_superior': upper * 100}
+    else:
+        positive_rate = None
+
+    return {
+        'metodo': sample['method'],
+        'amostra': n,
+        'populacao': N,
+        'fracao': n / N if N else 0.0,
+        'feedbacks_positivos': likes,
+        'feedbacks_negativos': dislikes,
+        'total_feedbacks': total,
+        'percentual_positivo': positive_rate,
+        'usuarios_distintos': _estimate_distinct_users(sample['user_rows'], n, census=n >= N)
+    }
+
+
+def approximate_statistics(csv_path, fraction=SAMPLE_FRACTION, seed=SAMPLE_SEED, method='aleatoria'):
+    """Lê a amostra e calcula as estatísticas aproximadas."""
+    return estimate_statistics(read_sample(csv_path, fraction, seed, method))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estatísticas aproximadas por amostragem.")
+    parser.add_argument('--csv', default=TRANSCRIPTS_FILENAME,
+                        help="CSV de transcrições de entrada (aceita .csv.gz, .csv.zst, .csv.bz2)")
+    parser.add_argument('--fracao', type=float, default=SAMPLE_FRACTION, help="Fração de linhas na amostra")
+    parser.add_argument('--semente', type=int, default=SAMPLE_SEED, help="Semente da amostragem")
+    parser.add_argument('--metodo', choices=SAMPLE_METHODS, default='aleatoria', help="Método de amostragem")
+    args = parser.parse_args()
+
+    csv_path = find_transcripts_file(args.csv)
+    print(f"🎲 Amostrando {args.fracao:.1%} de {csv_path} ({args.metodo}, semente {args.semente})...")
+    print("-" * 50)
+
+    resultado = approximate_statistics(csv_path, args.fracao, args.semente, args.metodo)
+
+    def format_interval(value, suffix=''):
+        return (f"{value['estimativa']:.1f}{suffix} "
+                f"(IC 95%: {value['ic_inferior']:.1f}{suffix} – {value['ic_superior']:.1f}{suffix})")
+
+    print(f"📊 Linhas na amostra: {resultado['amostra']} de {resultado['populacao']}")
+    print(f"✅ Feedbacks positivos: {format_interval(resultado['feedbacks_positivos'])}")
+    print(f"❌ Feedbacks negativos: {format_interval(resultado['feedbacks_negativos'])}")
+    print(f"📈 Total de feedbacks: {format_interval(resultado['total_feedbacks'])}")
+    if resultado['percentual_positivo']:
+        print(f"👍 Percentual positivo: {format_interval(resultado['percentual_positivo'], '%')}")
+    print(f"👥 Usuários distintos: {format_interval(resultado['usuarios_distintos'])}")
+    print("-" * 50)
@@ -0,0 +1,200 @@
+"""
+Testes da API HTTP local contra uma instância real (create_server com port=0)
+sobre um CSV pequeno de transcrições.
+"""
+import csv
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from api_server import create_server
+
+
+def user_message(msg_id, timestamp, text, user='u1', reply_to=None):
+    activity = {'id': msg_id, 'type': 'message', 'from': {'role': 1, 'aadObjectId': user},
+                'timestamp': timestamp, 'text': text}
+    if reply_to:
+        activity['replyToId'] = reply_to
+    return activity
+
+
+def bot_message(msg_id, timestamp, text):
+    return {'id': msg_id, 'type': 'message', 'from': {'role': 0}, 'timestamp': timestamp, 'text': text}
+
+
+def feedback(activity_id, timestamp, reply_to, reaction, comment, user='u1'):
+    return {
+        'id': activity_id, 'type': 'invoke', 'name': 'message/submitAction', 'replyToId': reply_to,
+        'from': {'role': 1, 'aadObjectId': user}, 'timestamp': timestamp,
+        'value': {'actionName': 'feedback', 'actionValue': {
+            'reaction': reaction, 'feedback': json.dumps({'feedbackText': comment})
+        }}
+    }
+
+
+ROWS = [
+    # Linha 0: dislike na resposta b1
+    ('2025-01-01T10:00:00Z', [
+        user_message('m1', '2025-01-01T10:00:00Z', 'qual o prazo?'),
+        bot_message('b1', '2025-01-01T10:00:05Z', 'o prazo é amanhã'),
+        feedback('f1', '2025-01-01T10:01:00Z', 'b1', 'dislike', 'resposta errada'),
+    ]),
+    # Linha 1: continua a conversa da linha 0 (mesma thread)
+    ('2025-01-01T10:02:00Z', [
+        bot_message('b1', '2025-01-01T10:00:05Z', 'o prazo é amanhã'),
+        user_message('m2', '2025-01-01T10:02:00Z', 'obrigado', reply_to='b1'),
+    ]),
+    # Linha 2: like em b3, outro dia e outro usuário
+    ('2025-01-03T09:00:00Z', [
+        user_message('m3', '2025-01-03T09:00:00Z', 'como abrir chamado?', user='u2'),
+        bot_message('b3', '2025-01-03T09:00:05Z', 'use o portal de chamados'),
+        feedback('f3', '2025-01-03T09:01:00Z', 'b3', 'like', 'ótimo', user='u2'),
+    ]),
+    # Linha 3: timestamps de tipos diferentes (falha ao ordenar as mensagens)
+    ('2025-01-04T09:00:00Z', [
+        user_message('m4', '2025-01-04T09:00:00Z', 'teste'),
+        bot_message('b4', 5, 'resposta'),
+    ]),
+]
+
+
+@pytest.fixture(scope='module')
+def server(tmp_path_factory):
+    csv_path = tmp_path_factory.mktemp('api') / 'conversationtranscripts.csv'
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['conversationtranscriptid', 'content', 'conversationstarttime'])
+        for idx, (start_time, activities) in enumerate(ROWS):
+            writer.writerow([f'id{idx}', json.dumps({'activities': activities}), start_time])
+
+    server = create_server(str(csv_path), port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def base_url(server):
+    return f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def request(base_url, path, headers=None):
+    """Retorna (status, cabeçalhos, corpo JSON ou None)."""
+    req = urllib.request.Request(base_url + path, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return response.status, response.headers, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        body = e.read()
+        return e.code, e.headers, json.loads(body) if body else None
+
+
+def test_stats(base_url):
+    status, headers, body = request(base_url, '/stats')
+    assert status == 200
+    assert headers['ETag']
+    assert body['total_conversas'] == 4
+    assert body['feedbacks_positivos'] == 1
+    assert body['feedbacks_negativos'] == 1
+    assert body['percentual_positivo'] == 50.0
+
+
+def test_stats_date_range(base_url):
+    status, _, body = request(base_url, '/stats?desde=2025-01-02&ate=2025-01-03')
+    assert status == 200
+    assert body['total_conversas'] == 1
+    assert (body['feedbacks_positivos'], body['feedbacks_negativos']) == (1, 0)
+
+
+def test_row(base_url):
+    status, _, body = request(base_url, '/rows/0')
+    assert status == 200
+    assert body['linha'] == 0
+    assert body['feedback'] == 'NEGATIVO'
+    assert [msg['id'] for msg in body['mensagens']] == ['m1', 'b1']
+    assert body['mensagens'][1]['feedbacks'][0]['reaction'] == 'dislike'
+
+
+def test_thread(base_url):
+    status, _, body = request(base_url, '/threads/1')
+    assert status == 200
+    assert body['thread'] == 0
+    assert body['linhas'] == [0, 1]
+    assert (body['likes'], body['dislikes']) == (0, 1)
+    assert [msg['id'] for msg in body['mensagens']] == ['m1', 'b1', 'm2']
+
+
+def test_feedbacks(base_url):
+    status, _, body = request(base_url, '/feedbacks?reacao=dislike')
+    assert status == 200
+    assert body['total'] == 1
+    assert body['feedbacks'][0]['mensagem_id'] == 'b1'
+    assert body['feedbacks'][0]['comentario'] == 'resposta errada'
+    assert body['feedbacks'][0]['linhas'] == [0, 1]
+
+    _, _, body = request(base_url, '/feedbacks?limit=1&offset=1')
+    assert body['total'] == 2
+    assert len(body['feedbacks']) == 1
+
+
+def test_search(base_url):
+    status, _, body = request(base_url, '/search?q=PORTAL')
+    assert status == 200
+    assert body['total'] == 1
+    assert body['resultados'][0]['linha'] == 2
+    assert body['resultados'][0]['mensagem_id'] == 'b3'
+
+
+@pytest.mark.parametrize('path', ['/inexistente', '/rows/99', '/threads/-1'])
+def test_not_found(base_url, path):
+    status, headers, body = request(base_url, path)
+    assert status == 404
+    assert 'erro' in body
+    assert headers['ETag'] is None
+
+
+@pytest.mark.parametrize('path', [
+    '/rows/abc',
+    '/stats?desde=01-01-2025',
+    '/search',
+    '/feedbacks?limit=abc',
+    '/feedbacks?limit=0',
+    '/feedbacks?limit=-5',
+])
+def test_bad_request(base_url, path):
+    status, _, body = request(base_url, path)
+    assert status == 400
+    assert 'erro' in body
+
+
+def test_server_error(base_url):
+    status, _, body = request(base_url, '/rows/3')
+    assert status == 500
+    assert 'erro' in body
+
+
+def test_if_none_match(base_url):
+    status, headers, _ = request(base_url, '/stats')
+    etag = headers['ETag']
+
+    status, headers, body = request(base_url, '/stats', {'If-None-Match': etag})
+    assert status == 304
+    assert headers['ETag'] == etag
+    assert body is None
+
+    # ETag de outra URL não vale
+    status, _, _ = request(base_url, '/rows/0', {'If-None-Match': etag})
+    assert status == 200
+
+
+@pytest.mark.parametrize('path, expected', [('/rows/99', 404), ('/feedbacks?limit=-5', 400)])
+def test_if_none_match_does_not_hide_errors(server, base_url, path, expected):
+    # Mesmo com o ETag que a URL teria, erros não viram 304
+    etag = server.RequestHandlerClass.api.etag(path)
+    status, _, _ = request(base_url, path, {'If-None-Match': etag})
+    assert status == expected
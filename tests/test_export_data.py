@@ -0,0 +1,20 @@
+"""
+Testes da exportação (export_data.py).
+"""
+import os
+
+import pytest
+
+from export_data import EXPORT_DIR, export_output_path
+
+
+def test_export_output_path_stays_in_export_dir():
+    assert export_output_path('conversas.csv') == os.path.join(EXPORT_DIR, 'conversas.csv')
+    assert export_output_path(' conversas.jsonl ') == os.path.join(EXPORT_DIR, 'conversas.jsonl')
+
+
+@pytest.mark.parametrize('filename', ['', ' ', '.', '..', '../app.py', 'app.py/..', 'sub/conversas.csv',
+                                      '/etc/passwd', 'sub\\conversas.csv'])
+def test_export_output_path_rejects_paths(filename):
+    with pytest.raises(ValueError):
+        export_output_path(filename)
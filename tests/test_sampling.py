@@ -0,0 +1,85 @@
+"""
+Testes das estatísticas aproximadas (sampling.py) sobre CSVs gerados.
+"""
+import csv
+import json
+from datetime import date, timedelta
+
+import pytest
+
+import sampling
+
+
+def liked_conversation(idx, start_time):
+    return [
+        {'id': f'm{idx}', 'type': 'message', 'from': {'role': 1, 'aadObjectId': f'u{idx % 7}'},
+         'timestamp': start_time, 'text': 'pergunta'},
+        {'id': f'b{idx}', 'type': 'message', 'from': {'role': 0},
+         'timestamp': start_time, 'text': 'resposta'},
+        {'id': f'f{idx}', 'type': 'invoke', 'name': 'message/submitAction', 'replyToId': f'b{idx}',
+         'from': {'role': 1, 'aadObjectId': f'u{idx % 7}'}, 'timestamp': start_time,
+         'value': {'actionName': 'feedback', 'actionValue': {'reaction': 'like', 'feedback': '{}'}}},
+    ]
+
+
+def plain_conversation(idx, start_time):
+    return [{'id': f'm{idx}', 'type': 'message', 'from': {'role': 1, 'aadObjectId': f'u{idx % 7}'},
+             'timestamp': start_time, 'text': 'pergunta'}]
+
+
+@pytest.fixture(scope='module')
+def uneven_days_csv(tmp_path_factory):
+    """
+    20 dias: os pares têm 10 conversas, todas com like; os ímpares têm 70,
+    sem feedback. Total real de likes: 100.
+    """
+    csv_path = tmp_path_factory.mktemp('sampling') / 'conversationtranscripts.csv'
+    with open(csv_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['conversationtranscriptid', 'content', 'conversationstarttime'])
+        idx = 0
+        for day in range(20):
+            start_time = f"{date(2025, 1, 1) + timedelta(days=day)}T10:00:00Z"
+            for _ in range(10 if day % 2 == 0 else 70):
+                build = liked_conversation if day % 2 == 0 else plain_conversation
+                writer.writerow([f'id{idx}', json.dumps({'activities': build(idx, start_time)}), start_time])
+                idx += 1
+    return str(csv_path)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_stratified_small_days_keep_their_weight(uneven_days_csv, seed):
+    stats = sampling.approximate_statistics(uneven_days_csv, 0.02, seed, 'estratificada')
+    likes = stats['feedbacks_positivos']
+    assert likes['estimativa'] == pytest.approx(100)
+    assert likes['ic_inferior'] <= 100 <= likes['ic_superior']
+    assert likes['ic_inferior'] < likes['ic_superior']
+
+
+@pytest.mark.parametrize('method', sampling.SAMPLE_METHODS)
+def test_zero_count_interval_is_not_degenerate(uneven_days_csv, method):
+    stats = sampling.approximate_statistics(uneven_days_csv, 0.1, 1, method)
+    dislikes = stats['feedbacks_negativos']
+    assert dislikes['estimativa'] == 0
+    assert dislikes['ic_superior'] > 0
+    assert stats['percentual_positivo']['ic_inferior'] < 100
+
+
+def test_collapsed_strata_variance_uses_stratum_sizes():
+    # Estratos do mesmo tamanho e mesma média: sem variância entre eles
+    assert sampling._collapsed_strata_variance([(10, 5.0), (10, 5.0)], None) == 0
+    assert sampling._collapsed_strata_variance([(10, 10.0), (70, 0.0)], None) > 0
+    assert sampling._collapsed_strata_variance([(10, 10.0)], None) == 0
+
+
+@pytest.mark.parametrize('method', sampling.SAMPLE_METHODS)
+def test_full_sample_is_exact(uneven_days_csv, method):
+    stats = sampling.approximate_statistics(uneven_days_csv, 1.0, 0, method)
+    assert stats['amostra'] == stats['populacao'] == 800
+    for key in ('feedbacks_positivos', 'feedbacks_negativos', 'percentual_positivo', 'usuarios_distintos'):
+        value = stats[key]
+        assert value['ic_inferior'] == pytest.approx(value['estimativa'])
+        assert value['ic_superior'] == pytest.approx(value['estimativa'])
+    assert stats['feedbacks_positivos']['estimativa'] == pytest.approx(100)
+    assert stats['percentual_positivo']['estimativa'] == pytest.approx(100)
+    assert stats['usuarios_distintos']['estimativa'] == 7
@@ -0,0 +1,21 @@
+"""
+Testes das funções de ingestão (transcripts.py).
+"""
+from transcripts import merge_thread_activities
+
+
+def test_merge_thread_activities_mixed_timestamps():
+    parsed_json_cache = {
+        0: {'activities': [
+            {'id': 'm1', 'type': 'message', 'timestamp': '2025-01-01T10:00:00Z'},
+            {'id': 'b1', 'type': 'message', 'timestamp': '2025-01-01T10:00:05Z'},
+        ]},
+        1: {'activities': [
+            {'id': 'b1', 'type': 'message', 'timestamp': '2025-01-01T10:00:05Z'},
+            {'id': 'm0', 'type': 'message', 'timestamp': 1735725000},  # 2025-01-01T09:50:00Z
+            {'id': 'x', 'type': 'message'},
+        ]},
+        2: None,
+    }
+    merged = merge_thread_activities([0, 1, 2], parsed_json_cache)
+    assert [activity['id'] for activity in merged['activities']] == ['x', 'm0', 'm1', 'b1']
@@ -0,0 +1,1057 @@
+"""
+Camada de ingestão e índices das transcrições do Dataverse.
+
+Funções puras (sem Streamlit) usadas pelo app (app.py) e pelos scripts
+de linha de comando. O app adiciona o cache por cima destas funções.
+"""
+import pandas as pd
+import json
+import os
+import re
+from collections import Counter
+from datetime import datetime, timezone
+
+debug = False
+
+TRANSCRIPTS_FILENAME = 'conversationtranscripts.csv'
+
+# Registros lidos por bloco do CSV
+CSV_CHUNK_SIZE = 50000
+
+# Exportações compactadas suportadas (descompressão em streaming pelo pandas)
+COMPRESSION_EXTENSIONS = {'.gz': 'gzip', '.zst': 'zstd', '.bz2': 'bz2'}
+COMPRESSION_MAGIC_BYTES = [(b'\x1f\x8b', 'gzip'), (b'\x28\xb5\x2f\xfd', 'zstd'), (b'BZh', 'bz2')]
+
+# Posição de atividades sem timestamp interpretável na ordenação cronológica
+MIN_TIMESTAMP = datetime.min.replace(tzinfo=timezone.utc)
+
+# Ordenações do ranking de usuários (build_user_ranking)
+USER_RANKING_ORDERS = ('activity', 'dislike_rate')
+
+# Tokenização dos comentários de feedback (palavras com letras, sem números)
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+(?:[-'][^\W\d_]+)*")
+STOPWORDS = frozenset('''
+a à ao aos as às até com como da das de dela dele deles do dos e é ela elas ele eles em entre era essa
+esse esta está estão este eu foi for há isso isto já la lhe mais mas me mesmo meu minha muito na nas
+não nem no nos nós o os ou para pela pelas pelo pelos por qual quando que quem se sem ser seu sua são
+também te tem tinha to tu um uma umas uns vai você vocês
+'''.split())
+
+
+# ============================================================================
+# CARREGAMENTO E ÍNDICES
+# ============================================================================
+
+def find_transcripts_file(csv_path=TRANSCRIPTS_FILENAME):
+    """
+    Retorna o caminho do CSV de transcrições, procurando também as versões
+    compactadas (.csv.gz, .csv.zst, .csv.bz2) quando o arquivo simples não existe.
+    """
+    if os.path.exists(csv_path):
+        return csv_path
+    for extension in COMPRESSION_EXTENSIONS:
+        if os.path.exists(csv_path + extension):
+            return csv_path + extension
+    return csv_path
+
+
+def detect_compression(csv_path):
+    """
+    Identifica a compressão do arquivo pela extensão ou, na falta dela,
+    pelos primeiros bytes. Retorna 'gzip', 'zstd', 'bz2' ou None.
+    """
+    extension = os.path.splitext(csv_path)[1].lower()
+    if extension in COMPRESSION_EXTENSIONS:
+        return COMPRESSION_EXTENSIONS[extension]
+    
+    with open(csv_path, 'rb') as f:
+        header = f.read(4)
+    for magic, compression in COMPRESSION_MAGIC_BYTES:
+        if header.startswith(magic):
+            return compression
+    return None
+
+
+def read_csv_chunks(csv_path, chunksize=CSV_CHUNK_SIZE, usecols=None, skiprows=None):
+    """
+    Lê o CSV de transcrições em blocos de DataFrame, descompactando em
+    streaming (.gz, .zst, .bz2) sem gerar cópia descompactada em disco.
+    
+    skiprows (opcional) é repassado ao pandas: com uma função, as linhas
+    descartadas não são materializadas (usado pela amostragem).
+    
+    NOTA: Arquivos .zst requerem o pacote zstandard (pip install zstandard).
+    """
+    compression = detect_compression(csv_path)
+    if debug: print(f"Lendo CSV em blocos (compressão: {compression or 'nenhuma'})...")
+    with pd.read_csv(csv_path, compression=compression, chunksize=chunksize, usecols=usecols,
+                     skiprows=skiprows) as reader:
+        for chunk in reader:
+            yield chunk
+
+
+def load_csv_data(csv_path):
+    """Carrega o CSV de transcrições (simples ou compactado)."""
+    if debug: print("Carregando CSV...")
+    return pd.concat(read_csv_chunks(csv_path), ignore_index=True)
+
+
+def project_activity(activity):
+    """
+    Projeta uma atividade apenas nos campos usados pelo pipeline, mantendo a
+    mesma estrutura aninhada (from/value) para que o restante do código não mude:
+    id, type, name, from.role, from.aadObjectId, timestamp, text, replyToId,
+    valueType, value.name/newValue, value.actionName/actionValue e se há attachments.
+    
+    Descarta corpos de attachments, channelData e valores de traces que não
+    são GeneratedAnswer.
+    """
+    projected = {}
+    for key in ('id', 'type', 'name', 'timestamp', 'text', 'replyToId', 'valueType'):
+        if key in activity:
+            projected[key] = activity[key]
+    
+    from_data = activity.get('from')
+    if from_data:
+        projected['from'] = {
+            'role': from_data.get('role'),
+            'aadObjectId': from_data.get('aadObjectId')
+        }
+    
+    value = activity.get('value')
+    if isinstance(value, dict):
+        projected_value = {}
+        if 'name' in value:
+            projected_value['name'] = value['name']
+            # Só o valor da resposta gerada é exibido
+            if value['name'] == 'GeneratedAnswer' and 'newValue' in value:
+                projected_value['newValue'] = value['newValue']
+        if 'actionName' in value:
+            projected_value['actionName'] = value['actionName']
+            if 'actionValue' in value:
+                projected_value['actionValue'] = value['actionValue']
+        projected['value'] = projected_value
+    
+    # Apenas a presença de attachments é usada (cards visuais)
+    if activity.get('attachments'):
+        projected['attachments'] = True
+    
+    return projected
+
+
+def parse_all_json_content(df_content_series, projected=True):
+    """
+    Parseia todos os JSONs do CSV uma única vez.
+    Retorna um dicionário {índice: dados_parseados}.
+    
+    Com projected=True (padrão), mantém apenas {'activities': [...]} com cada
+    atividade projetada por project_activity, liberando o restante do JSON
+    logo após o parse para reduzir o uso de memória.
+    """
+    if debug: print("Parseando todos os JSONs do CSV...")
+    parsed_data = {}
+    for idx, content in enumerate(df_content_series):
+        try:
+            if pd.notna(content):
+                data = json.loads(content)
+                if projected:
+                    data = {'activities': [project_activity(a) for a in data.get('activities', [])]}
+                parsed_data[idx] = data
+            else:
+                parsed_data[idx] = None
+        except (json.JSONDecodeError, AttributeError, TypeError):
+            parsed_data[idx] = None
+    return parsed_data
+
+
+def build_global_id_map(parsed_json_cache):
+    """
+    Constrói um mapa global de TODOS os IDs de mensagens do CSV inteiro,
+    a partir dos JSONs já parseados (parse_all_json_content).
+    Retorna: {message_id: {'rows': [lista de índices], 'type': tipo, 'text': texto}}
+    
+    Isso permite buscar mensagens que estão em OUTRAS linhas do CSV.
+    """
+    if debug: print("Construindo mapa global de IDs...")
+    global_id_map = {}
+    
+    for idx in range(len(parsed_json_cache)):
+        try:
+            parsed_data = parsed_json_cache.get(idx)
+            if parsed_data is None:
+                continue
+            activities = parsed_data.get('activities', [])
+            
+            for activity in activities:
+                activity_id = activity.get('id')
+                if not activity_id:
+                    continue
+                
+                if activity_id not in global_id_map:
+                    global_id_map[activity_id] = {
+                        'rows': [],
+                        'type': activity.get('type'),
+                        'text': activity.get('text', '')[:200] if activity.get('text') else '',
+                        'from_role': activity.get('from', {}).get('role')
+                    }
+                global_id_map[activity_id]['rows'].append(idx)
+        except Exception:
+            continue
+    
+    return global_id_map
+
+
+def compute_feedback_column(row_message_ids, all_feedbacks_map):
+    """
+    Calcula a coluna 'feedback' para todas as linhas de uma vez, a partir do
+    índice de mensagens por linha (build_row_message_ids).
+    Retorna uma lista de valores ('POSITIVO', 'NEGATIVO', ou '').
+    """
+    if debug: print("Calculando coluna de feedback...")
+    feedback_values = []
+    
+    for message_ids in row_message_ids:
+        # Verificar feedbacks das mensagens desta linha
+        has_positive = False
+        has_negative = False
+        for msg_id in message_ids:
+            feedbacks = all_feedbacks_map.get(msg_id, [])
+            for feedback in feedbacks:
+                reaction = feedback.get('reaction', '')
+                if reaction == 'like':
+                    has_positive = True
+                elif reaction == 'dislike':
+                    has_negative = True
+        
+        if has_negative:
+            feedback_values.append('NEGATIVO')
+        elif has_positive:
+            feedback_values.append('POSITIVO')
+        else:
+            feedback_values.append('')
+    
+    return feedback_values
+
+
+def build_row_message_ids(parsed_json_cache):
+    """
+    Lista, para cada linha, os IDs das mensagens que podem receber feedback
+    (mensagens e traces GeneratedAnswer), a partir dos JSONs já parseados.
+    Retorna: [frozenset de IDs por linha]
+    """
+    if debug: print("Indexando mensagens por linha...")
+    row_message_ids = []
+    for idx in range(len(parsed_json_cache)):
+        parsed_data = parsed_json_cache.get(idx)
+        message_ids = set()
+        if parsed_data is not None:
+            for activity in parsed_data.get('activities', []):
+                msg_id = activity.get('id')
+                if not msg_id:
+                    continue
+                if activity.get('type') == 'message':
+                    message_ids.add(msg_id)
+                elif (activity.get('type') == 'trace' and
+                      activity.get('valueType') == 'VariableAssignment' and
+                      activity.get('value', {}).get('name') == 'GeneratedAnswer'):
+                    message_ids.add(msg_id)
+        row_message_ids.append(frozenset(message_ids))
+    return row_message_ids
+
+
+def compute_statistics_from_index(rows, row_message_ids, all_feedbacks_map):
+    """
+    Calcula estatísticas de feedbacks das linhas informadas, usando o índice
+    de mensagens por linha (build_row_message_ids) em vez de parsear os JSONs.
+    Retorna: (total_positive, total_negative)
+    
+    Cada mensagem é contada uma única vez, mesmo que apareça em várias das
+    linhas, e todos os seus feedbacks do mapa global são somados.
+    """
+    all_message_ids = set()
+    for idx in rows:
+        all_message_ids.update(row_message_ids[idx])
+    
+    total_positive = 0
+    total_negative = 0
+    for msg_id in all_message_ids:
+        for feedback in all_feedbacks_map.get(msg_id, []):
+            reaction = feedback.get('reaction', '')
+            if reaction == 'like':
+                total_positive += 1
+            elif reaction == 'dislike':
+                total_negative += 1
+    
+    return total_positive, total_negative
+
+
+def load_all_feedbacks(parsed_json_cache, global_id_map):
+    """
+    Carrega TODOS os feedbacks de TODAS as linhas do CSV, a partir dos JSONs
+    já parseados (parse_all_json_content).
+    Retorna um dicionário mapeando message_id -> lista de feedbacks.
+    
+    LÓGICA DE BUSCA (em ordem de prioridade):
+    1. BUSCA GLOBAL POR ID: Usa o mapa global para encontrar o ID em QUALQUER linha
+    2. BUSCA TEMPORAL (Heurística): Para IDs não encontrados, busca a mensagem de BOT 
+       mais próxima ANTES do feedback NA MESMA LINHA
+    
+    TIPOS DE FEEDBACK CAPTURADOS:
+    - invoke com actionName='feedback' (feedback com texto e reação like/dislike)
+    
+    NOTA: messageReaction não é capturado porque no dataset atual não contém 
+    informação sobre o tipo de reação (like/dislike), apenas que houve interação.
+    """
+    if debug: print("Carregando todos os feedbacks...")
+    all_feedbacks = {}  # {message_id: [lista de feedbacks]}
+    
+    for idx in range(len(parsed_json_cache)):
+        try:
+            parsed_data = parsed_json_cache.get(idx)
+            if parsed_data is None:
+                continue
+            
+            # Ordenar atividades cronologicamente (essencial para heurística temporal).
+            # Cópia ordenada: o cache de JSONs é compartilhado e não pode ser alterado.
+            activities = sorted(parsed_data.get('activities', []), key=lambda x: x.get('timestamp', 0))
+            
+            # ================================================================
+            # Feedbacks invoke (actionName='feedback')
+            # ================================================================
+            for i, activity in enumerate(activities):
+                if (activity.get('type') == 'invoke' and 
+                    activity.get('name') == 'message/submitAction'):
+                    
+                    value = activity.get('value', {})
+                    if value.get('actionName') == 'feedback':
+                        target_msg_id = activity.get('replyToId')
+                        found_msg_id = None
+                        metodo = None
+                        
+                        # TENTATIVA 1: Busca GLOBAL por ID (em TODAS as linhas)
+                        if target_msg_id and target_msg_id in global_id_map:
+                            found_msg_id = target_msg_id
+                            # Verificar se está na mesma linha ou em outra
+                            rows_with_id = global_id_map[target_msg_id]['rows']
+                            if idx in rows_with_id:
+                                metodo = 'ID'
+                            else:
+                                metodo = 'ID_CROSS'  # ID encontrado em outra linha
+                        
+                        # TENTATIVA 2: Busca temporal (Heurística) - fallback
+                        # Procura a mensagem de BOT mais próxima ANTES deste feedback
+                        if not found_msg_id:
+                            for j in range(i - 1, -1, -1):
+                                cand = activities[j]
+                                role = cand.get('from', {}).get('role')
+                                cand_id = cand.get('id')
+                                
+                                # Verifica se é mensagem tradicional do Bot (role 0)
+                                is_bot_message = cand.get('type') == 'message' and role == 0
+                                
+                                # Verifica se é trace/GeneratedAnswer do Bot
+                                is_generated_answer = (
+                                    cand.get('type') == 'trace' and
+                                    cand.get('valueType') == 'VariableAssignment' and
+                                    cand.get('value', {}).get('name') == 'GeneratedAnswer' and
+                                    role == 0
+                                )
+                                
+                                if (is_bot_message or is_generated_answer) and cand_id:
+                                    found_msg_id = cand_id
+                                    metodo = 'TEMPO'
+                                    break
+                        
+                        # Se encontrou a mensagem alvo, associar o feedback
+                        if found_msg_id:
+                            if found_msg_id not in all_feedbacks:
+                                all_feedbacks[found_msg_id] = []
+                            
+                            feedback_data = value.get('actionValue', {}).copy()
+                            feedback_data['_metodo_identificacao'] = metodo
+                            all_feedbacks[found_msg_id].append(feedback_data)
+                        
+        except Exception:
+            continue
+    
+    return all_feedbacks
+
+
+def build_user_index(parsed_json_cache):
+    """
+    Constrói um índice de usuários a partir de TODAS as linhas do CSV,
+    usando os JSONs já parseados (parse_all_json_content).
+    Retorna: {aadObjectId: {'rows': [índices], 'likes': n, 'dislikes': n,
+                            'first_seen': datetime, 'last_seen': datetime}}
+
+    Permite abrir as conversas de um usuário em O(1), sem varrer o dataset
+    novamente. Feedbacks são contados por ID da atividade invoke, pois a
+    mesma atividade pode aparecer repetida em várias linhas do CSV.
+    """
+    if debug: print("Construindo índice de usuários...")
+    user_index = {}
+    seen_feedback_ids = set()
+
+    for idx in range(len(parsed_json_cache)):
+        try:
+            parsed_data = parsed_json_cache.get(idx)
+            if parsed_data is None:
+                continue
+            activities = parsed_data.get('activities', [])
+
+            for activity in activities:
+                from_data = activity.get('from', {})
+                user_id = from_data.get('aadObjectId')
+
+                # Apenas usuários (role == 1) com ID
+                if from_data.get('role') != 1 or not user_id:
+                    continue
+
+                if user_id not in user_index:
+                    user_index[user_id] = {
+                        'rows': [],
+                        'likes': 0,
+                        'dislikes': 0,
+                        'first_seen': None,
+                        'last_seen': None
+                    }
+                user_data = user_index[user_id]
+
+                if not user_data['rows'] or user_data['rows'][-1] != idx:
+                    user_data['rows'].append(idx)
+
+                # Primeira/última aparição do usuário
+                dt = parse_timestamp(activity.get('timestamp'))
+                if dt is not None:
+                    if user_data['first_seen'] is None or dt < user_data['first_seen']:
+                        user_data['first_seen'] = dt
+                    if user_data['last_seen'] is None or dt > user_data['last_seen']:
+                        user_data['last_seen'] = dt
+
+                # Feedbacks dados pelo usuário (contados uma única vez)
+                if (activity.get('type') == 'invoke' and
+                    activity.get('name') == 'message/submitAction' and
+                    activity.get('value', {}).get('actionName') == 'feedback'):
+
+                    activity_id = activity.get('id')
+                    if activity_id:
+                        if activity_id in seen_feedback_ids:
+                            continue
+                        seen_feedback_ids.add(activity_id)
+
+                    reaction = activity.get('value', {}).get('actionValue', {}).get('reaction', '')
+                    if reaction == 'like':
+                        user_data['likes'] += 1
+                    elif reaction == 'dislike':
+                        user_data['dislikes'] += 1
+        except Exception:
+            continue
+
+    return user_index
+
+
+def build_user_ranking(user_index, order_by='activity'):
+    """
+    Monta o ranking de usuários a partir do índice.
+    order_by: 'activity' (nº de conversas) ou 'dislike_rate' (taxa de feedbacks negativos)
+    """
+    records = []
+    for user_id, user_data in user_index.items():
+        total_feedbacks = user_data['likes'] + user_data['dislikes']
+        dislike_rate = (user_data['dislikes'] / total_feedbacks * 100) if total_feedbacks > 0 else 0.0
+        records.append({
+            'usuario': user_id,
+            'conversas': len(user_data['rows']),
+            'likes': user_data['likes'],
+            'dislikes': user_data['dislikes'],
+            'taxa_negativa': round(dislike_rate, 1),
+            'primeira_vez': user_data['first_seen'].strftime('%Y/%m/%d') if user_data['first_seen'] else '',
+            'ultima_vez': user_data['last_seen'].strftime('%Y/%m/%d') if user_data['last_seen'] else ''
+        })
+
+    ranking = pd.DataFrame(records, columns=[
+        'usuario', 'conversas', 'likes', 'dislikes', 'taxa_negativa', 'primeira_vez', 'ultima_vez'
+    ])
+    if order_by == 'dislike_rate':
+        return ranking.sort_values(['taxa_negativa', 'dislikes'], ascending=False, ignore_index=True)
+    return ranking.sort_values(['conversas', 'likes'], ascending=False, ignore_index=True)
+
+
+def build_thread_index(parsed_json_cache, global_id_map):
+    """
+    Agrupa linhas do CSV que pertencem à mesma conversa lógica (thread).
+    Retorna: {'row_to_thread': [thread de cada linha], 'threads': {thread: [linhas]}}
+
+    Usa union-find sobre duas ligações:
+    1. IDs de atividades compartilhados entre linhas (listas 'rows' do mapa global)
+    2. Cadeias de resposta (replyToId apontando para atividade de outra linha)
+
+    O identificador da thread é o menor índice de linha do grupo.
+    """
+    if debug: print("Agrupando linhas em threads...")
+    parent = list(range(len(parsed_json_cache)))
+
+    def find(row):
+        root = row
+        while parent[root] != root:
+            root = parent[root]
+        # Compressão de caminho
+        while parent[row] != root:
+            parent[row], row = root, parent[row]
+        return root
+
+    def union(row_a, row_b):
+        root_a, root_b = find(row_a), find(row_b)
+        if root_a != root_b:
+            # Menor índice vira a raiz
+            if root_a < root_b:
+                parent[root_b] = root_a
+            else:
+                parent[root_a] = root_b
+
+    # LIGAÇÃO 1: IDs compartilhados entre linhas
+    for id_info in global_id_map.values():
+        rows = id_info['rows']
+        for other_row in rows[1:]:
+            union(rows[0], other_row)
+
+    # LIGAÇÃO 2: Cadeias de resposta (replyToId), a partir dos JSONs já parseados
+    for idx in range(len(parsed_json_cache)):
+        try:
+            parsed_data = parsed_json_cache.get(idx)
+            if parsed_data is None:
+                continue
+            for activity in parsed_data.get('activities', []):
+                reply_to = activity.get('replyToId')
+                if reply_to and reply_to in global_id_map:
+                    union(idx, global_id_map[reply_to]['rows'][0])
+        except Exception:
+            continue
+
+    row_to_thread = [find(idx) for idx in range(len(parent))]
+    threads = {}
+    for idx, thread_id in enumerate(row_to_thread):
+        threads.setdefault(thread_id, []).append(idx)
+
+    return {'row_to_thread': row_to_thread, 'threads': threads}
+
+
+def compute_thread_feedback(thread_index, row_message_ids, all_feedbacks_map):
+    """
+    Calcula rótulo e contagens de feedback por thread, unindo os IDs de
+    mensagens das linhas do grupo (build_row_message_ids).
+    Retorna: {thread: {'feedback': 'POSITIVO'|'NEGATIVO'|'', 'likes': n, 'dislikes': n}}
+
+    Cada mensagem é contada uma única vez por thread, mesmo que apareça
+    em várias linhas do grupo.
+    """
+    if debug: print("Calculando feedback por thread...")
+    thread_feedback = {}
+    for thread_id, thread_rows in thread_index['threads'].items():
+        message_ids = set().union(*(row_message_ids[idx] for idx in thread_rows))
+        likes = 0
+        dislikes = 0
+        for msg_id in message_ids:
+            for feedback in all_feedbacks_map.get(msg_id, []):
+                reaction = feedback.get('reaction', '')
+                if reaction == 'like':
+                    likes += 1
+                elif reaction == 'dislike':
+                    dislikes += 1
+
+        # Priorizar negativo se houver ambos
+        if dislikes > 0:
+            label = 'NEGATIVO'
+        elif likes > 0:
+            label = 'POSITIVO'
+        else:
+            label = ''
+        thread_feedback[thread_id] = {'feedback': label, 'likes': likes, 'dislikes': dislikes}
+
+    return thread_feedback
+
+
+def tokenize_text(text):
+    """
+    Divide o texto em termos: minúsculas, apenas palavras com letras,
+    sem stopwords e sem termos de uma letra.
+    """
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in STOPWORDS
+    ]
+
+
+def _count_terms(term_index, source, reaction, day, text, row_indices):
+    """Conta termos e bigramas de um texto e liga cada termo às linhas de origem."""
+    tokens = tokenize_text(text)
+    terms = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    if not terms:
+        return
+    key = (source, reaction, day)
+    if key not in term_index['counts']:
+        term_index['counts'][key] = Counter()
+        term_index['term_rows'][key] = {}
+    term_index['counts'][key].update(terms)
+    key_rows = term_index['term_rows'][key]
+    for term in set(terms):
+        key_rows.setdefault(term, set()).update(row_indices)
+
+
+def build_term_index(parsed_json_cache, all_feedbacks_map, include_answers=True):
+    """
+    Tokeniza os comentários de feedback (e, opcionalmente, as respostas do bot
+    que receberam feedback) uma única vez, a partir dos JSONs já parseados.
+    Retorna: {'counts': {(fonte, reação, dia): Counter de termos e bigramas},
+              'term_rows': {(fonte, reação, dia): {termo: {linhas onde aparece}}},
+              'days': [dias com feedback, ordenados]}
+    
+    fonte: 'comentario' (texto do feedback) ou 'resposta' (mensagem avaliada).
+    Bigramas são contados como "termo1 termo2". Textos ausentes, vazios ou que
+    não são string são ignorados.
+    """
+    if debug: print("Indexando termos dos feedbacks...")
+    term_index = {'counts': {}, 'term_rows': {}, 'days': []}
+    
+    # Atividades podem aparecer em várias linhas: contar uma vez, ligar a todas
+    feedback_activities = {}  # {id: [atividade, linhas]}
+    answer_activities = {}    # {id: [atividade, linhas]}
+    for idx in range(len(parsed_json_cache)):
+        parsed_data = parsed_json_cache.get(idx)
+        if parsed_data is None:
+            continue
+        for activity in parsed_data.get('activities', []):
+            try:
+                activity_id = activity.get('id')
+                if (activity.get('type') == 'invoke' and
+                    activity.get('name') == 'message/submitAction' and
+                    activity.get('value', {}).get('actionName') == 'feedback'):
+                    target = feedback_activities
+                elif include_answers and activity_id in all_feedbacks_map and activity.get('from', {}).get('role') == 0:
+                    target = answer_activities
+                else:
+                    continue
+                key = activity_id or (idx, id(activity))
+                if key not in target:
+                    target[key] = [activity, set()]
+                target[key][1].add(idx)
+            except Exception:
+                continue
+    
+    days = set()
+    for activity, rows in feedback_activities.values():
+        try:
+            action_value = activity.get('value', {}).get('actionValue', {})
+            if not isinstance(action_value, dict):
+                continue
+            comment = extract_feedback_text(action_value)
+            if not isinstance(comment, str) or not comment.strip() or comment == '[Sem comentário]':
+                continue
+            dt = parse_timestamp(activity.get('timestamp'))
+            day = dt.date() if dt else None
+            _count_terms(term_index, 'comentario', action_value.get('reaction', ''), day, comment, rows)
+            days.add(day)
+        except Exception:
+            continue
+    
+    for activity_id, (activity, rows) in answer_activities.items():
+        try:
+            if activity.get('type') == 'trace':
+                text = activity.get('value', {}).get('newValue', '')
+            else:
+                text = activity.get('text', '')
+            if not isinstance(text, str) or not text.strip():
+                continue
+            dt = parse_timestamp(activity.get('timestamp'))
+            day = dt.date() if dt else None
+            # Uma contagem por reação recebida pela resposta
+            reactions = {feedback.get('reaction', '') for feedback in all_feedbacks_map[activity_id]}
+            for reaction in reactions:
+                _count_terms(term_index, 'resposta', reaction, day, text, rows)
+            days.add(day)
+        except Exception:
+            continue
+    
+    term_index['days'] = sorted(day for day in days if day is not None)
+    return term_index
+
+
+def _matching_term_keys(term_index, reaction, source, start_date=None, end_date=None):
+    """Chaves (fonte, reação, dia) do índice de termos dentro da seleção e do período."""
+    for key in term_index['counts']:
+        key_source, key_reaction, day = key
+        if key_source != source or key_reaction != reaction:
+            continue
+        if (start_date or end_date) and day is None:
+            continue
+        if start_date and day < start_date:
+            continue
+        if end_date and day > end_date:
+            continue
+        yield key
+
+
+def term_rows(term_index, term, reaction='dislike', source='comentario', start_date=None, end_date=None):
+    """
+    Linhas onde o termo aparece para a reação e fonte no período, as mesmas
+    consideradas por top_terms. Retorna um set de índices de linha.
+    """
+    rows = set()
+    for key in _matching_term_keys(term_index, reaction, source, start_date, end_date):
+        rows.update(term_index['term_rows'][key].get(term, ()))
+    return rows
+
+
+def top_terms(term_index, reaction='dislike', source='comentario', bigrams=False,
+              start_date=None, end_date=None, limit=20):
+    """
+    Termos (ou bigramas) mais frequentes para uma reação e fonte no período.
+    Retorna: [(termo, contagem, nº de linhas)] em ordem decrescente de contagem.
+    
+    Soma os contadores diários já calculados na ingestão, sem retokenizar.
+    O nº de linhas considera apenas a mesma reação, fonte e período.
+    """
+    keys = list(_matching_term_keys(term_index, reaction, source, start_date, end_date))
+    total = Counter()
+    for key in keys:
+        total.update(term_index['counts'][key])
+    
+    ranking = [(term, count) for term, count in total.items() if (' ' in term) == bigrams]
+    ranking.sort(key=lambda item: (-item[1], item[0]))
+    
+    result = []
+    for term, count in ranking[:limit]:
+        rows = set()
+        for key in keys:
+            rows.update(term_index['term_rows'][key].get(term, ()))
+        result.append((term, count, len(rows)))
+    return result
+
+
+def merge_thread_activities(thread_rows, parsed_json_cache):
+    """
+    Junta as atividades de todas as linhas de uma thread, sem duplicatas
+    (mesmo ID em várias linhas), em ordem cronológica.
+    Retorna dados no mesmo formato de uma linha parseada: {'activities': [...]}
+    
+    Linhas diferentes podem trazer timestamps em formatos diferentes (ISO ou
+    Unix): a ordenação usa parse_timestamp, e atividades sem timestamp
+    interpretável vão para o início.
+    """
+    merged = []
+    seen_ids = set()
+    for row_idx in thread_rows:
+        parsed_data = parsed_json_cache.get(row_idx)
+        if parsed_data is None:
+            continue
+        for activity in parsed_data.get('activities', []):
+            activity_id = activity.get('id')
+            if activity_id:
+                if activity_id in seen_ids:
+                    continue
+                seen_ids.add(activity_id)
+            merged.append(activity)
+
+    merged.sort(key=lambda x: parse_timestamp(x.get('timestamp')) or MIN_TIMESTAMP)
+    return {'activities': merged}
+
+
+def extract_feedback_column(json_string, all_feedbacks_map, global_id_map):
+    """
+    Retorna POSITIVO, NEGATIVO ou vazio para a coluna feedback.
+    
+    Esta função verifica se as MENSAGENS desta linha receberam feedbacks,
+    independentemente de em qual linha do CSV o feedback está.
+    
+    REGRA: A coluna 'feedback' indica se alguma mensagem DESTA linha
+    recebeu feedback, não se esta linha contém atividades de feedback.
+    """
+    if debug: print("Extraindo coluna de feedback...")
+    try:
+        data = json.loads(json_string)
+        activities = data.get('activities', [])
+        
+        # Coletar IDs de mensagens desta linha
+        message_ids = set()
+        for activity in activities:
+            msg_id = activity.get('id')
+            if not msg_id:
+                continue
+                
+            # Mensagem tradicional
+            if activity.get('type') == 'message':
+                message_ids.add(msg_id)
+            
+            # Trace/GeneratedAnswer do Bot
+            elif (activity.get('type') == 'trace' and
+                  activity.get('valueType') == 'VariableAssignment' and
+                  activity.get('value', {}).get('name') == 'GeneratedAnswer'):
+                message_ids.add(msg_id)
+        
+        # Verificar se alguma mensagem desta linha recebeu feedback
+        has_positive = False
+        has_negative = False
+        
+        for msg_id in message_ids:
+            feedbacks = all_feedbacks_map.get(msg_id, [])
+            for feedback in feedbacks:
+                reaction = feedback.get('reaction', '')
+                if reaction == 'like':
+                    has_positive = True
+                elif reaction == 'dislike':
+                    has_negative = True
+        
+        # Priorizar negativo se houver ambos
+        if has_negative:
+            return 'NEGATIVO'
+        elif has_positive:
+            return 'POSITIVO'
+        else:
+            return ''
+    except Exception:
+        return ''
+
+
+# ============================================================================
+# FORMATAÇÃO E EXTRAÇÃO
+# ============================================================================
+
+def format_timestamp(timestamp_str):
+    """
+    Formata timestamp para formato legível: HH:MM:SS
+    """
+    try:
+        # Tentar como ISO string
+        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
+        return dt.strftime('%H:%M:%S')
+    except:
+        try:
+            # Tentar como timestamp Unix (segundos desde epoch)
+            if isinstance(timestamp_str, (int, float)) or (isinstance(timestamp_str, str) and timestamp_str.isdigit()):
+                dt = datetime.fromtimestamp(int(timestamp_str))
+                return dt.strftime('%H:%M:%S')
+        except:
+            pass
+        return str(timestamp_str)
+
+
+def parse_timestamp(timestamp_value):
+    """
+    Converte timestamp (ISO string ou Unix) em datetime com fuso UTC.
+    Retorna None se não for possível interpretar.
+    """
+    try:
+        if isinstance(timestamp_value, (int, float)) or (isinstance(timestamp_value, str) and timestamp_value.isdigit()):
+            return datetime.fromtimestamp(int(timestamp_value), tz=timezone.utc)
+        dt = datetime.fromisoformat(timestamp_value.replace('Z', '+00:00'))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=timezone.utc)
+        return dt
+    except Exception:
+        return None
+
+
+def extract_chat_content(parsed_data, all_feedbacks_map):
+    """
+    Extrai mensagens de UMA linha do CSV (já parseada) e associa feedbacks de TODAS as linhas.
+    
+    Args:
+        parsed_data: Dados JSON já parseados da linha atual
+        all_feedbacks_map: Dicionário com TODOS os feedbacks do CSV inteiro
+    
+    Returns:
+        Lista de mensagens com seus feedbacks associados
+    """
+    if debug: print("Extraindo conteúdo do chat...")
+    try:
+        if parsed_data is None:
+            return []
+            
+        # Ordenar atividades cronologicamente para exibição correta
+        # (cópia ordenada: parsed_data é compartilhado e não pode ser modificado)
+        activities = sorted(parsed_data.get('activities', []), key=lambda x: x.get('timestamp', 0))
+        
+        # Extrair mensagens desta linha
+        messages = []
+        for activity in activities:
+            msg_id = activity.get('id')
+            text = None
+            is_user = False
+            should_include = False
+            
+            # Mensagem tradicional
+            if activity.get('type') == 'message':
+                text = activity.get('text', '').strip()
+                is_user = activity.get('from', {}).get('role') == 1
+                
+                # Verificar se tem attachments (cards visuais)
+                if not text:
+                    if activity.get('attachments'):
+                        text = "[Conteúdo Visual/Card]"
+                        should_include = True
+                    else:
+                        # Verificar se tem feedback associado (mensagem vazia com feedback)
+                        if msg_id and msg_id in all_feedbacks_map:
+                            text = "[Mensagem sem texto]"
+                            should_include = True
+                else:
+                    should_include = True
+            
+            # Trace/GeneratedAnswer do Bot (nova estrutura)
+            elif (activity.get('type') == 'trace' and
+                  activity.get('valueType') == 'VariableAssignment' and
+                  activity.get('value', {}).get('name') == 'GeneratedAnswer'):
+                text = activity.get('value', {}).get('newValue', '').strip()
+                is_user = False  # GeneratedAnswer é sempre do bot
+                
+                if text:
+                    should_include = True
+                elif msg_id and msg_id in all_feedbacks_map:
+                    # Trace vazio mas com feedback
+                    text = "[Resposta gerada vazia]"
+                    should_include = True
+            
+            # Se encontrou uma mensagem válida ou com feedback, adicionar à lista
+            if should_include and msg_id:
+                # Buscar feedbacks para esta mensagem em TODAS as linhas do CSV
+                feedbacks_for_this_message = all_feedbacks_map.get(msg_id, [])
+                
+                messages.append({
+                    'id': msg_id,
+                    'time': format_timestamp(activity.get('timestamp', '')),
+                    'timestamp': activity.get('timestamp', ''),
+                    'is_user': is_user,
+                    'text': text,
+                    'feedbacks': feedbacks_for_this_message
+                })
+        
+        return messages
+    except Exception as e:
+        raise ValueError(f"Erro ao processar chat: {str(e)}") from e
+
+
+def extract_feedback_text(feedback_value):
+    """
+    Extrai o texto do feedback do campo 'feedback' que é uma string JSON.
+    """
+    try:
+        feedback_str = feedback_value.get('feedback', '{}')
+        if isinstance(feedback_str, str):
+            feedback_data = json.loads(feedback_str)
+            return feedback_data.get('feedbackText', '[Sem comentário]')
+        return '[Sem comentário]'
+    except:
+        return '[Sem comentário]'
+
+
+def format_datetime(datetime_str):
+    """
+    Formata datetime para AAAA/MM/DD
+    """
+    try:
+        dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
+        return dt.strftime('%Y/%m/%d')
+    except:
+        return datetime_str
+
+
+# ============================================================================
+# DATASET
+# ============================================================================
+
+def load_dataset(csv_path):
+    """
+    Executa o pipeline de ingestão completo e retorna o dataset indexado:
+    {'df', 'global_id_map', 'all_feedbacks', 'parsed_json', 'row_message_ids',
+     'term_index', 'user_index', 'user_rankings', 'thread_index', 'min_date', 'max_date'}
+    
+    IMPORTANTE: O resultado é compartilhado entre consumidores (app, CLI);
+    eles apenas leem o DataFrame e os índices, nunca os modificam.
+    """
+    if debug: print("Montando dataset...")
+    df = load_csv_data(csv_path)
+    
+    # JSONs parseados uma única vez; os demais índices são montados a partir deles
+    parsed_json_cache = parse_all_json_content(df['content'])
+    global_id_map = build_global_id_map(parsed_json_cache)
+    all_feedbacks_global = load_all_feedbacks(parsed_json_cache, global_id_map)
+    row_message_ids = build_row_message_ids(parsed_json_cache)
+    term_index = build_term_index(parsed_json_cache, all_feedbacks_global)
+    
+    # Coluna de feedback e índice de usuários
+    df['feedback'] = compute_feedback_column(row_message_ids, all_feedbacks_global)
+    user_index = build_user_index(parsed_json_cache)
+    user_rankings = {order: build_user_ranking(user_index, order) for order in USER_RANKING_ORDERS}
+    
+    # Threads (linhas da mesma conversa lógica)
+    thread_index = build_thread_index(parsed_json_cache, global_id_map)
+    thread_feedback = compute_thread_feedback(thread_index, row_message_ids, all_feedbacks_global)
+    df['thread'] = thread_index['row_to_thread']
+    df['feedback_thread'] = [thread_feedback[t]['feedback'] for t in df['thread']]
+    df['likes_thread'] = [thread_feedback[t]['likes'] for t in df['thread']]
+    df['dislikes_thread'] = [thread_feedback[t]['dislikes'] for t in df['thread']]
+    df['linhas_thread'] = [len(thread_index['threads'][t]) for t in df['thread']]
+    
+    # Formatar conversationstarttime se existir
+    min_date = None
+    max_date = None
+    if 'conversationstarttime' in df.columns:
+        df['conversationstarttime_formatted'] = df['conversationstarttime'].apply(format_datetime)
+        # Criar coluna de data (sem hora) para filtro
+        df['conversation_date'] = pd.to_datetime(df['conversationstarttime'], errors='coerce').dt.date
+        if pd.notna(df['conversation_date'].min()) and pd.notna(df['conversation_date'].max()):
+            min_date = df['conversation_date'].min()
+            max_date = df['conversation_date'].max()
+    
+    return {
+        'df': df,
+        'global_id_map': global_id_map,
+        'all_feedbacks': all_feedbacks_global,
+        'parsed_json': parsed_json_cache,
+        'row_message_ids': row_message_ids,
+        'term_index': term_index,
+        'user_index': user_index,
+        'user_rankings': user_rankings,
+        'thread_index': thread_index,
+        'min_date': min_date,
+        'max_date': max_date
+    }
+
+
+def filter_rows(dataset, only_with_feedback=False, group_threads=False, start_date=None, user_id=None,
+                term_rows=None):
+    """
+    Aplica os filtros da lista de conversas ao dataset.
+    Retorna o DataFrame filtrado (índice = número da linha no CSV).
+    
+    Com term_rows (ex: resultado de transcripts.term_rows), mantém apenas as
+    linhas cujos feedbacks (ou respostas avaliadas) contêm o termo escolhido.
+    
+    Com group_threads, retorna uma linha (a raiz) por thread e o filtro de
+    feedback usa o rótulo da thread.
+    """
+    df = dataset['df']
+    
+    # Filtro de usuário: acesso direto às linhas pelo índice
+    if user_id:
+        df_filtered = df.loc[dataset['user_index'].get(user_id, {}).get('rows', [])]
+    else:
+        df_filtered = df
+    
+    # Filtro de termo: linhas ligadas ao termo no índice
+    if term_rows is not None:
+        df_filtered = df_filtered[df_filtered.index.isin(term_rows)]
+    
+    feedback_column = 'feedback_thread' if group_threads else 'feedback'
+    if only_with_feedback:
+        df_filtered = df_filtered[df_filtered[feedback_column] != '']
+    
+    # Filtro de data
+    if start_date is not None and 'conversation_date' in df_filtered.columns:
+        df_filtered = df_filtered[df_filtered['conversation_date'] >= start_date]
+    
+    # Agrupar em threads: uma linha (a raiz) por thread
+    if group_threads:
+        df_filtered = df.loc[sorted(set(df_filtered['thread']))]
+    
+    return df_filtered